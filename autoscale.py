@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+autoscale.py：按机器资源自动增减常驻浏览器进程数
+         （定时采样可用内存、CPU 负载和单任务耗时 + 在 worker_range 范围内逐个增减 + 退役进程做完手上任务再退出 + 每次决策打印原因）
+工作进程用 next_task 领取任务、report 回报每个任务的耗时；
+调度方定期调用 tick(排队任务数)，全部任务被领走后调用 drain() 让进程做完手上任务退出。
+"""
+
+import time
+import statistics
+from queue import Empty
+from multiprocessing import Event, Process, Queue
+
+try:
+    import psutil  # 可选：没有时按固定进程数运行
+except ImportError:
+    psutil = None
+
+import telemetry
+from config import adaptive_workers, worker_range, min_free_memory_mb
+
+# -------- 配置 --------
+ENABLED        = adaptive_workers == 1 and psutil is not None
+MIN_WORKERS    = max(1, worker_range[0])
+MAX_WORKERS    = max(MIN_WORKERS, worker_range[1])
+MIN_FREE_MB    = min_free_memory_mb  # 可用内存低于该值时减少浏览器；新增浏览器后也要留出这么多
+CPU_HIGH       = 90     # CPU 占用高于该百分比时减少浏览器
+CPU_GROW       = 75     # CPU 占用低于该百分比才新增浏览器
+MIN_GAIN       = 0.1    # 多开一个浏览器后总吞吐（进程数 / 单任务耗时）至少提高的比例，否则视为没有收益（网站限流或带宽打满）
+MIN_SAMPLES    = 5      # 一个采样周期内至少完成多少个任务，单任务耗时才参与决策
+INTERVAL       = 20     # 两次决策之间的最短间隔（秒），新浏览器启动、跑出耗时数据都需要时间
+CAP_SECONDS    = 300    # 因耗时变长而减少后，多久之内不再超过这个数量
+BROWSER_MB     = 500    # 还没有测到实际值时，每个浏览器进程（含 Chrome）预估占用的内存（MB）
+# ----------------------
+
+MB = 1024 * 1024
+
+
+def next_task(queue, stop=None, stats=None):
+    """
+    从共享队列领取下一个任务。给定 stop 时每秒检查一次，被要求退出（缩容或全部领完）时返回 None；
+    给定 stats 时回报一次领取，调度方据此计算排队任务数。
+    """
+    if stop is None:
+        task = queue.get()
+    else:
+        task = None
+        while not stop.is_set():
+            try:
+                task = queue.get(timeout=1)
+                break
+            except Empty:
+                continue
+    if task is not None and stats is not None:
+        stats.put(("take", None))
+    return task
+
+
+def report(stats, seconds: float):
+    """回报一个任务的耗时（秒）；stats 为 None 时忽略"""
+    if stats is not None:
+        stats.put(("task", seconds))
+
+
+def process_rss_mb(pid: int) -> float:
+    """进程及其全部子进程（chromedriver、Chrome）占用的内存（MB），读取失败返回 0"""
+    try:
+        proc = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True)) / MB
+    except Exception:
+        return 0
+
+
+class Worker:
+    def __init__(self, worker_id, proc, stop):
+        self.id, self.proc, self.stop = worker_id, proc, stop
+
+    @property
+    def active(self) -> bool:
+        return self.proc.is_alive() and not self.stop.is_set()
+
+
+class WorkerPool:
+    """
+    自动伸缩的进程池。make_args(编号, stop, stats) 返回 target 的参数，
+    target 必须用 next_task(…, stop, stats) 领取任务，收到 None 时退出。
+    """
+
+    def __init__(self, name: str, target, make_args, initial: int, lo=None, hi=None):
+        self.name, self.target, self.make_args = name, target, make_args
+        self.lo = MIN_WORKERS if lo is None else lo
+        self.hi = max(self.lo, MAX_WORKERS if hi is None else hi)
+        self.initial = min(max(initial, self.lo), self.hi)
+        self.stats = Queue()
+        self.workers = []
+        self.next_id = 0
+        self.taken = 0
+        self.latencies = []
+        self.level_latency = {}   # 进程数 -> 最近一个周期的单任务耗时中位数
+        self.cap, self.cap_until = self.hi, 0
+        self.last_decision = 0
+        self.last_hold = None
+        self.draining = False
+
+    # ———— 进程管理 ————
+    def start(self):
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # 第一次调用只建立基准
+        for _ in range(self.initial):
+            self._spawn()
+        self.last_decision = time.monotonic()
+        print(f"[扩缩] {self.name}：启动 {self.initial} 个浏览器进程，范围 {self.lo}-{self.hi}")
+        return self
+
+    def _spawn(self):
+        stop = Event()
+        proc = Process(target=self.target, args=self.make_args(self.next_id, stop, self.stats))
+        proc.start()
+        self.workers.append(Worker(self.next_id, proc, stop))
+        self.next_id += 1
+
+    def active(self) -> list:
+        return [w for w in self.workers if w.active]
+
+    def alive(self) -> bool:
+        return any(w.proc.is_alive() for w in self.workers)
+
+    def drain(self):
+        """任务已全部领走：所有进程做完手上的任务后退出"""
+        self.draining = True
+        for w in self.workers:
+            w.stop.set()
+
+    def join(self):
+        self.drain()
+        for w in self.workers:
+            w.proc.join()
+
+    # ———— 采样与决策 ————
+    def _collect(self):
+        while True:
+            try:
+                kind, value = self.stats.get_nowait()
+            except Empty:
+                return
+            if kind == "take":
+                self.taken += 1
+            else:
+                self.latencies.append(value)
+
+    def browser_mb(self, active) -> float:
+        """每个浏览器进程的平均内存；还没有测到时用预估值"""
+        sizes = [mb for mb in (process_rss_mb(w.proc.pid) for w in active) if mb > 0]
+        return max(sum(sizes) / len(sizes), BROWSER_MB) if sizes else BROWSER_MB
+
+    def tick(self, backlog: int):
+        """调度方定期调用；backlog 为还没有被领取的任务数"""
+        self._collect()
+        now = time.monotonic()
+        if self.draining or now - self.last_decision < INTERVAL:
+            return
+        self.last_decision = now
+        active = self.active()
+        n = len(active)
+        if any(w.proc.is_alive() and w.stop.is_set() for w in self.workers):
+            return  # 上次退役的进程还在做手上的任务，等它退出后再按新的资源状况决策
+        if n < self.lo and backlog > 0:
+            # 进程异常退出，补足下限（不依赖 psutil 采样）
+            self._log(n, n + 1, f"只剩 {n} 个进程在运行，补足下限 {self.lo}")
+            self._spawn()
+            return
+        if psutil is None:
+            return
+
+        avail = psutil.virtual_memory().available / MB
+        cpu = psutil.cpu_percent(interval=None)
+        per = self.browser_mb(active)
+        lat = statistics.median(self.latencies) if len(self.latencies) >= MIN_SAMPLES else None
+        self.latencies = []
+        if lat is not None:
+            self.level_latency[n] = lat
+        if now > self.cap_until:
+            self.cap = self.hi
+        prev = self.level_latency.get(n - 1)
+
+        if n > self.lo and avail < MIN_FREE_MB:
+            self._retire(active, f"可用内存 {avail:.0f}MB 低于保留值 {MIN_FREE_MB}MB")
+        elif n > self.lo and cpu > CPU_HIGH:
+            self._retire(active, f"CPU 占用 {cpu:.0f}% 高于 {CPU_HIGH}%")
+        elif n > self.lo and lat and prev and n / lat < (n - 1) / prev * (1 + MIN_GAIN):
+            self.cap, self.cap_until = n - 1, now + CAP_SECONDS
+            self._retire(active, f"{n - 1} → {n} 个浏览器后单任务耗时 {prev:.1f}s → {lat:.1f}s，"
+                                 f"总吞吐 {(n - 1) / prev * 60:.0f} → {n / lat * 60:.0f} 个/分钟，提升不到 {MIN_GAIN:.0%}，"
+                                 f"{CAP_SECONDS}s 内不超过 {n - 1} 个")
+        elif n >= min(self.hi, self.cap):
+            self._hold("cap", f"已达上限 {min(self.hi, self.cap)} 个")
+        elif backlog <= n:
+            self._hold("backlog", f"排队任务 {backlog} 个，不需要更多浏览器")
+        elif avail - per < MIN_FREE_MB:
+            self._hold("memory", f"可用内存 {avail:.0f}MB，再开一个浏览器（约 {per:.0f}MB）会低于保留值 {MIN_FREE_MB}MB")
+        elif cpu >= CPU_GROW:
+            self._hold("cpu", f"CPU 占用 {cpu:.0f}% 不低于 {CPU_GROW}%")
+        else:
+            speed = f"，单任务耗时 {lat:.1f}s" if lat is not None else ""
+            self._log(n, n + 1, f"排队任务 {backlog} 个，可用内存 {avail:.0f}MB"
+                                f"（每个浏览器约 {per:.0f}MB），CPU 占用 {cpu:.0f}%{speed}")
+            self._spawn()
+
+    def _retire(self, active, reason):
+        """最后启动的进程做完手上的任务后退出，浏览器缓存较冷，损失最小"""
+        n = len(active)
+        self._log(n, n - 1, reason)
+        active[-1].stop.set()
+
+    def _hold(self, kind, reason):
+        # 不调整时只在原因类别变化时打印一次，避免刷屏
+        if kind != self.last_hold:
+            print(f"[扩缩] {self.name}：保持 {len(self.active())} 个，{reason}")
+            telemetry.event("autoscale", pool=self.name, workers=len(self.active()), action="hold", reason=reason)
+        self.last_hold = kind
+
+    def _log(self, old, new, reason):
+        action = "grow" if new > old else "shrink"
+        print(f"[扩缩] {self.name}：{old} → {new} 个浏览器，{reason}")
+        telemetry.event("autoscale", pool=self.name, workers=new, action=action, reason=reason)
+        self.last_hold = None
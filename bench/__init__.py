@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""bench：离线基准测试脚本，在项目根目录用 python -m bench.<脚本名> 运行"""
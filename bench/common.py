@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/common.py：基准测试公用工具（本地固定页面路径、无头浏览器、WebDriver 命令计数、峰值内存采样、浏览器 CPU 时间）
+"""
+
+import os
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+
+import netcapture
+
+try:
+    import psutil  # 可选：用于统计峰值内存
+except ImportError:
+    psutil = None
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture_url(name: str) -> str:
+    return "file:///" + os.path.join(FIXTURE_DIR, name).replace("\\", "/").lstrip("/")
+
+
+def make_driver(headless=True, network=False, lean=False, tabs=False):
+    """
+    基准测试用 Chrome。设置环境变量 CHROMEDRIVER 指定驱动路径，
+    否则交给 Selenium Manager 自动查找（Linux 机器上无需 chromedriver-win64）。
+    network=True 时打开网络日志（pipeline 的网络模式需要），lean=True 时使用 pipeline 的精简浏览配置，
+    tabs=True 时关闭后台标签页降速（pipeline 的多标签页模式）。
+    """
+    opts = Options()
+    if headless:
+        opts.add_argument("--headless")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    if network:
+        netcapture.enable(opts)
+    if lean or tabs:
+        import pipeline  # 只有用到这些配置的基准才导入
+    if lean:
+        pipeline.lean_profile(opts)
+    if tabs:
+        pipeline.background_tabs(opts)
+    path = os.environ.get("CHROMEDRIVER")
+    service = Service(executable_path=path) if path else Service()
+    driver = webdriver.Chrome(service=service, options=opts)
+    if lean:
+        pipeline.block_resources(driver)
+    return driver
+
+
+def browser_cpu_seconds(driver):
+    """chromedriver 及其全部 Chrome 子进程累计占用的 CPU 时间（秒），没有 psutil 时返回 None"""
+    if psutil is None:
+        return None
+    total = 0.0
+    proc = psutil.Process(driver.service.process.pid)
+    for p in [proc] + proc.children(recursive=True):
+        try:
+            t = p.cpu_times()
+            total += t.user + t.system
+        except psutil.Error:
+            pass
+    return total
+
+
+class CommandCounter:
+    """统计发往 chromedriver 的 HTTP 命令数"""
+
+    def __init__(self, driver):
+        self.count = 0
+        executor = driver.command_executor
+        original = executor.execute
+
+        def execute(command, params):
+            self.count += 1
+            return original(command, params)
+
+        executor.execute = execute
+
+    def measure(self, fn, *args, **kwargs):
+        """执行 fn，返回 (结果, 期间发出的命令数)"""
+        before = self.count
+        result = fn(*args, **kwargs)
+        return result, self.count - before
+
+
+class PeakRSS:
+    """
+    后台线程定时采样本进程及全部子进程（chromedriver、Chrome、工作进程）的内存之和，记录峰值。
+    没有安装 psutil 时 peak_mb 为 None。
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            total = 0
+            for p in [me] + me.children(recursive=True):
+                try:
+                    total += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if psutil is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def peak_mb(self):
+        return self.peak / 1024 / 1024 if psutil is not None else None
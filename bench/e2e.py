@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/e2e.py：离线端到端基准，不访问外网。启动本地替身服务器（bench/server.py），用真实的无头 Chrome 依次运行
+scrape_leaf（列表翻页）-> crawl_metrics（商品指标页，含近30天切换，以及一次加载读 7+30 两个窗口）-> process_csv（爬取 + 下载图片 + 写 Excel）
+-> process_excel（最终处理），报告每一步的 页/秒、行/秒 和峰值内存，并核对抓到的数据
+用法（项目根目录，Linux）：python -m bench.e2e [--pages 3] [--rows 20] [--items 20] [--latency 0.05] [--render-ms 150]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from openpyxl import load_workbook
+
+import crawler
+import pipeline
+import final_process
+import waits
+from bench.common import make_driver, PeakRSS
+from bench.server import FixtureServer, metric_values, METRIC_TITLES
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准")
+    parser.add_argument("--pages", type=int, default=3, help="列表页分页数")
+    parser.add_argument("--rows", type=int, default=20, help="每页商品数")
+    parser.add_argument("--items", type=int, default=20, help="crawl_metrics 单独测试的商品页数")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器每个请求的额外延迟（秒）")
+    parser.add_argument("--render-ms", type=int, default=150, help="页面内异步渲染延迟（毫秒）")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口")
+    args = parser.parse_args()
+
+    results = []  # (步骤, 耗时, 页数, 行数, 峰值内存MB)
+    problems = []
+    cwd = os.getcwd()
+    base = tempfile.mkdtemp(prefix="e2e_bench_")
+    first, second, leaf = "一级0", "二级0-0", "叶子0-0-0"
+
+    with FixtureServer(latency=args.latency, render_ms=args.render_ms,
+                       pages=args.pages, rows=args.rows) as server:
+        # 图片缓存、journal、数据集、统计文件都按相对路径落在临时目录里
+        os.chdir(base)
+        try:
+            # process_csv 的爬取子进程通过 fork 继承这里换上的驱动（Linux 下有效）
+            pipeline.init_driver = lambda: make_driver(headless=not args.headed)
+            driver = make_driver(headless=not args.headed)
+            try:
+                # 1) 列表页翻页抓取
+                folder = os.path.join(pipeline.INPUT_DIR, first, second)
+                with PeakRSS() as rss:
+                    start = time.perf_counter()
+                    driver.get(f"{server.base_url}/list")
+                    waits.wait_for(driver, waits.pagination_shows(1), "打开列表页", timeout=10)
+                    crawler.scrape_leaf(driver, folder, leaf)
+                    secs = time.perf_counter() - start
+                csv_path = crawler.leaf_csv_path(folder, leaf)
+                links = list(pipeline.read_links(csv_path))
+                if len(links) != args.pages * args.rows:
+                    problems.append(f"scrape_leaf 抓到 {len(links)} 行，应为 {args.pages * args.rows} 行")
+                results.append(("scrape_leaf", secs, args.pages, len(links), rss.peak_mb))
+
+                # 2) 商品指标页（近30天）
+                urls = [url for _, url, _ in links][:args.items]
+                with PeakRSS() as rss:
+                    data, secs = timed(lambda: [pipeline.crawl_metrics(driver, u, "30") for u in urls])
+                correct = sum(
+                    [d.get(k) for k in METRIC_TITLES] == metric_values(int(u.rsplit("/", 1)[-1]), 30)
+                    for u, d in zip(urls, data))
+                if correct != len(urls):
+                    problems.append(f"crawl_metrics 只有 {correct}/{len(urls)} 页的近30天指标正确")
+                results.append(("crawl_metrics", secs, len(urls), correct, rss.peak_mb))
+
+                # 2b) 同一次页面加载读近7天和近30天
+                with PeakRSS() as rss:
+                    data, secs = timed(lambda: [pipeline.crawl_metrics(driver, u, "7+30") for u in urls])
+                correct = sum(
+                    all([pipeline.window_view(d, w).get(k) for k in METRIC_TITLES]
+                        == metric_values(int(u.rsplit("/", 1)[-1]), int(w)) for w in ("7", "30"))
+                    for u, d in zip(urls, data))
+                if correct != len(urls):
+                    problems.append(f"crawl_metrics 7+30 只有 {correct}/{len(urls)} 页的两个窗口都正确")
+                results.append(("crawl_metrics 7+30", secs, len(urls), correct, rss.peak_mb))
+            finally:
+                driver.quit()
+
+            # 3) 解析链接：常驻浏览器爬取 + 下载 JPEG/WEBP/MPO 图片 + 写 Excel
+            out = os.path.join(pipeline.OUTPUT_DIR, first, second, f"{leaf}.xlsx")
+            with PeakRSS() as rss:
+                _, secs = timed(pipeline.process_csv, csv_path, out)
+            rows = load_workbook(out, read_only=True).active.max_row - 1 if os.path.exists(out) else 0
+            if rows != len(links):
+                problems.append(f"process_csv 写出 {rows} 行，应为 {len(links)} 行")
+            results.append(("process_csv", secs, len(links), rows, rss.peak_mb))
+
+            # 4) 最终处理（逐格版）
+            if os.path.exists(out):
+                with PeakRSS() as rss:
+                    _, secs = timed(final_process.process_excel, out)
+                results.append(("process_excel", secs, 0, rows, rss.peak_mb))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(base, ignore_errors=True)
+        requests = server.requests
+
+    print(f"\n延迟 {args.latency}s/请求，渲染 {args.render_ms}ms，服务器共处理 {requests} 个请求")
+    print(f"{'步骤':<20}{'耗时(s)':>10}{'页/秒':>10}{'行/秒':>10}{'峰值内存(MB)':>14}")
+    for name, secs, pages, rows, peak in results:
+        peak_s = f"{peak:.0f}" if peak is not None else "-"
+        pages_s = f"{pages / secs:.2f}" if pages else "-"
+        print(f"{name:<20}{secs:>10.2f}{pages_s:>10}{rows / secs:>10.1f}{peak_s:>14}")
+    for p in problems:
+        print(f"[异常] {p}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
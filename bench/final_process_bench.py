@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/final_process_bench.py：生成一批与 pipeline 输出格式相同的 Excel，
+对比逐格版 process_excel（单进程）与列式版 process_excel_fast（多进程）的耗时，并逐格核对结果一致
+用法（项目根目录）：python -m bench.final_process_bench [文件数] [每个文件行数]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image as PILImage
+
+import final_process
+from pipeline import HEADERS, IMAGE_SHOW_WIDTH, IMAGE_SHOW_HEIGHT
+
+
+def fake_row(rng):
+    """一行仿真数据，数值格式与页面抓到的一致（千分位、百分号）"""
+    n = lambda lo, hi: f"{rng.randint(lo, hi):,}"
+    return [
+        None,
+        f"https://detail.tmall.com/item.htm?id={rng.randint(10**11, 10**12)}",
+        f"https://img.alicdn.com/imgextra/i{rng.randint(1, 4)}/O1CN01{rng.randint(0, 10**9)}.jpg",
+        f"商品{rng.randint(0, 10**6)}",
+        n(0, 2_000_000), f"{n(0, 5_000_000)}%", n(0, 60_000), n(0, 60_000),
+        f"{rng.randint(0, 20)}%", n(0, 300_000), f"{rng.randint(0, 20)}%",
+        n(0, 10_000), f"{rng.uniform(-50, 400):.2f}%",
+    ]
+
+
+def make_workbook(path, rows, rng, png):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    data = [fake_row(rng) for _ in range(rows)]
+    # 约一成重复行，覆盖去重逻辑
+    for _ in range(rows // 10):
+        data.insert(rng.randrange(len(data) + 1), list(rng.choice(data)))
+    for r, row in enumerate(data, start=2):
+        ws.append(row)
+        img = XLImage(BytesIO(png))
+        img.width, img.height = IMAGE_SHOW_WIDTH, IMAGE_SHOW_HEIGHT
+        ws.add_image(img, f"A{r}")
+    wb.save(path)
+
+
+def sheet_values(path):
+    ws = load_workbook(path).active
+    return ws.freeze_panes, [tuple(c.value for c in row) for row in ws.iter_rows()]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rows  = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    rng = random.Random(0)
+    buf = BytesIO()
+    PILImage.new("RGB", (200, 200), (200, 80, 40)).save(buf, format="PNG")
+
+    base = tempfile.mkdtemp(prefix="final_process_bench_")
+    try:
+        src = os.path.join(base, "src")
+        os.makedirs(src)
+        for i in range(count):
+            make_workbook(os.path.join(src, f"{i:04d}.xlsx"), rows, rng, buf.getvalue())
+        legacy_dir = shutil.copytree(src, os.path.join(base, "legacy"))
+        fast_dir   = shutil.copytree(src, os.path.join(base, "fast"))
+        names = sorted(os.listdir(src))
+
+        start = time.perf_counter()
+        for name in names:
+            final_process.process_excel(os.path.join(legacy_dir, name))
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=final_process.PROCESSES) as pool:
+            errors = list(pool.map(final_process._process_one,
+                                   [os.path.join(fast_dir, n) for n in names]))
+        fast_s = time.perf_counter() - start
+        assert not any(errors), [e for e in errors if e]
+
+        diff = [n for n in names
+                if sheet_values(os.path.join(legacy_dir, n)) != sheet_values(os.path.join(fast_dir, n))]
+        print(f"{count} 个文件 × 约 {rows} 行")
+        print(f"逐格单进程：{legacy_s:.2f}s  列式 {final_process.PROCESSES} 进程：{fast_s:.2f}s  "
+              f"加速 {legacy_s / fast_s:.1f}x")
+        print("结果一致" if not diff else f"结果不一致：{diff[:10]}")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
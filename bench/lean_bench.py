@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/lean_bench.py：精简浏览配置对比。本地替身服务器的商品页附带主图、详情图、网络字体、视频和统计脚本（heavy 模式），
+同一批商品页分别用完整配置和 pipeline 的精简配置（lean_browser）跑 crawl_metrics，
+报告每页耗时、服务器发出的字节数和请求数、浏览器 CPU 时间，并核对指标
+用法（项目根目录）：python -m bench.lean_bench [--items 20] [--range 30] [--latency 0.05] [--render-ms 150]
+"""
+
+import sys
+import time
+import argparse
+
+import pipeline
+from bench.common import make_driver, browser_cpu_seconds
+from bench.server import FixtureServer, metric_values, METRIC_TITLES
+
+
+def run(server, urls, days, lean):
+    driver = make_driver(lean=lean)
+    try:
+        warmup, urls = urls[0], urls[1:]
+        pipeline.crawl_metrics(driver, warmup, days)  # 预热：启动后的第一页不计入
+        requests, sent = server.requests, server.bytes_sent
+        cpu = browser_cpu_seconds(driver)
+        start = time.perf_counter()
+        data = [pipeline.crawl_metrics(driver, u, days) for u in urls]
+        secs = time.perf_counter() - start
+        cpu = browser_cpu_seconds(driver) - cpu if cpu is not None else None
+        correct = sum([d.get(k) for k in METRIC_TITLES] == metric_values(int(u.rsplit("/", 1)[-1]), int(days))
+                      for u, d in zip(urls, data))
+        return secs, server.requests - requests, server.bytes_sent - sent, cpu, correct
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完整配置与精简配置对比")
+    parser.add_argument("--items", type=int, default=20, help="商品页数")
+    parser.add_argument("--range", default="30", choices=["7", "30"], help="时间范围")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器每个请求的额外延迟（秒）")
+    parser.add_argument("--render-ms", type=int, default=150, help="页面内异步渲染延迟（毫秒）")
+    args = parser.parse_args()
+
+    pipeline.NETWORK_CAPTURE = False
+    results, problems = [], []
+    with FixtureServer(latency=args.latency, render_ms=args.render_ms, heavy=True) as server:
+        # 每页用不同商品，避免浏览器缓存让完整配置占便宜；第一页由 run 用于预热，实测 args.items 页
+        urls = [f"{server.base_url}/item/{i}" for i in range(1, args.items + 2)]
+        results.append(("完整", *run(server, urls, args.range, False)))
+        results.append(("精简", *run(server, urls, args.range, True)))
+
+    n = args.items
+    print(f"近{args.range}天，{n} 页，延迟 {args.latency}s/请求，渲染 {args.render_ms}ms")
+    print(f"{'配置':<8}{'秒/页':>10}{'请求/页':>10}{'KB/页':>10}{'CPU秒/页':>12}{'正确':>8}")
+    for name, secs, requests, sent, cpu, correct in results:
+        cpu_s = f"{cpu / n:.3f}" if cpu is not None else "-"
+        print(f"{name:<8}{secs / n:>10.3f}{requests / n:>10.1f}{sent / n / 1024:>10.0f}{cpu_s:>12}{correct:>5}/{n}")
+        if correct != n:
+            problems.append(f"{name}配置只有 {correct}/{n} 页正确")
+    full, lean = results
+    print(f"精简配置：耗时 {full[1] / lean[1]:.1f}x，流量减少 {(1 - lean[3] / full[3]) * 100:.0f}%")
+    for p in problems:
+        print(f"[异常] {p}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
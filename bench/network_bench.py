@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/network_bench.py：商品指标页两种读取方式对比。本地替身服务器的接口版商品页（/item_api/<id>）加载后请求
+指标 JSON 再渲染；分别用解析页面（等卡片渲染）和网络模式（读取接口响应）跑 crawl_metrics，核对数值并报告每页耗时
+用法（项目根目录）：python -m bench.network_bench [--items 20] [--range 30] [--latency 0.05] [--render-ms 300]
+"""
+
+import sys
+import time
+import argparse
+
+import pipeline
+from bench.common import make_driver
+from bench.server import FixtureServer, metric_values, METRIC_TITLES
+
+
+def run(driver, urls, days, network):
+    pipeline.NETWORK_CAPTURE = network
+    start = time.perf_counter()
+    data = [pipeline.crawl_metrics(driver, u, days) for u in urls]
+    secs = time.perf_counter() - start
+    correct = sum([d.get(k) for k in METRIC_TITLES] == metric_values(int(u.rsplit("/", 1)[-1]), int(days))
+                  and d.get("商品名称") == f"商品{u.rsplit('/', 1)[-1]}" for u, d in zip(urls, data))
+    return secs, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析页面与网络模式对比")
+    parser.add_argument("--items", type=int, default=20, help="商品页数")
+    parser.add_argument("--range", default="30", choices=["7", "30"], help="时间范围")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器每个请求的额外延迟（秒）")
+    parser.add_argument("--render-ms", type=int, default=300, help="收到数据后的渲染延迟（毫秒）")
+    args = parser.parse_args()
+
+    problems = []
+    with FixtureServer(latency=args.latency, render_ms=args.render_ms) as server:
+        urls = [f"{server.base_url}/item_api/{i}" for i in range(1, args.items + 1)]
+        driver = make_driver(network=True)
+        try:
+            results = [("解析页面", *run(driver, urls, args.range, False)),
+                       ("网络模式", *run(driver, urls, args.range, True))]
+        finally:
+            driver.quit()
+
+    print(f"近{args.range}天，{args.items} 页，延迟 {args.latency}s/请求，渲染 {args.render_ms}ms")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'秒/页':>10}{'正确':>8}")
+    for name, secs, correct in results:
+        print(f"{name:<10}{secs:>10.2f}{secs / args.items:>10.3f}{correct:>5}/{args.items}")
+        if correct != args.items:
+            problems.append(f"{name}只有 {correct}/{args.items} 页正确")
+    print(f"网络模式加速 {results[0][1] / results[1][1]:.1f}x")
+    for p in problems:
+        print(f"[异常] {p}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
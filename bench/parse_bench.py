@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/parse_bench.py：指标页解析微基准。对已渲染的指标页快照（fixtures/item_saved.html，填充到接近线上整页的体量），
+对比原来的整页 BeautifulSoup 解析与预编译 XPath 的 lxml 解析；加 --browser 时再在无头 Chrome 中对比
+page_source + BeautifulSoup 与一次脚本调用只取卡片（含 WebDriver 传输）。三者结果必须一致
+用法（项目根目录）：python -m bench.parse_bench [--kb 600] [--repeat 200] [--browser]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import pipeline
+from bench.common import FIXTURE_DIR, fixture_url, make_driver
+
+
+def filler(kb: int) -> str:
+    """推荐位、导航等与指标无关的节点，凑够 kb KB"""
+    block = ('<div class="offer_card"><a href="https://detail.1688.com/offer/{i}.html">'
+             '<img src="https://cbu01.alicdn.com/img/ibank/O1CN01{i}.jpg"></a>'
+             '<div class="offer_title"><span>推荐商品 {i}</span><span class="tag">包邮</span></div>'
+             '<div class="offer_price"><em>￥</em><strong>{i}.00</strong></div>'
+             '<ul class="offer_attrs"><li>颜色：黑色</li><li>尺码：S/M/L/XL</li><li>产地：浙江</li></ul></div>')
+    parts, size, i = [], 0, 0
+    while size < kb * 1024:
+        s = block.format(i=i)
+        parts.append(s)
+        size += len(s.encode("utf-8"))
+        i += 1
+    return '<div class="recommend">' + "".join(parts) + "</div>"
+
+
+def per_call(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(arg)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标页解析微基准")
+    parser.add_argument("--kb", type=int, default=600, help="页面填充到多少 KB")
+    parser.add_argument("--repeat", type=int, default=200, help="每种解析器重复次数")
+    parser.add_argument("--browser", action="store_true", help="同时在无头 Chrome 中对比（含 WebDriver 传输）")
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURE_DIR, "item_saved.html"), encoding="utf-8") as f:
+        page = f.read().replace("__FILLER__", filler(args.kb))
+    print(f"页面 {len(page.encode('utf-8')) / 1024:.0f}KB，每种解析器 {args.repeat} 次")
+
+    soup, soup_ms = per_call(pipeline.parse_metrics_soup, page, args.repeat)
+    fast, fast_ms = per_call(pipeline.parse_metrics_html, page, args.repeat)
+    problems = [] if fast == soup else [f"lxml 解析结果不一致：{fast} != {soup}"]
+    print(f"{'BeautifulSoup 整页':<24}{soup_ms:>10.2f} ms/页")
+    print(f"{'lxml 预编译 XPath':<24}{fast_ms:>10.2f} ms/页  （{soup_ms / fast_ms:.1f}x）")
+
+    if args.browser:
+        base = tempfile.mkdtemp(prefix="parse_bench_")
+        driver = make_driver()
+        try:
+            path = os.path.join(base, "item.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(page)
+            driver.get(fixture_url(path))
+            repeat = max(1, args.repeat // 10)
+            old, old_ms = per_call(lambda d: pipeline.parse_metrics_soup(d.page_source), driver, repeat)
+            new, new_ms = per_call(pipeline.read_metrics, driver, repeat)
+            if new != old:
+                problems.append(f"页内脚本结果不一致：{new} != {old}")
+            print(f"{'page_source + BS':<24}{old_ms:>10.2f} ms/页")
+            print(f"{'页内脚本只取卡片':<24}{new_ms:>10.2f} ms/页  （{old_ms / new_ms:.1f}x）")
+        finally:
+            driver.quit()
+            shutil.rmtree(base, ignore_errors=True)
+
+    for p in problems:
+        print(f"[异常] {p}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
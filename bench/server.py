@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/server.py：本地 1688 替身服务器，离线跑基准测试用
+         /list 列表页（级联菜单 + 商品表格 + 分页），/item/<id> 商品指标页（指标卡片 + 近30天 + 详情链接），
+         /item_api/<id> 同一页面的接口版（指标由 /api/metrics/<id>?range=7|30 的 JSON 填充），
+         /img/<id>.jpg|.webp|.mpo 商品图片；每个请求可加固定延迟，页面内数据按 render_ms 异步渲染。
+         heavy=True 时商品页像线上一样附带主图、详情图、网络字体、视频和统计脚本（/font、/media、/alilog）
+用法（项目根目录）：python -m bench.server [--port 8765] [--latency 0.1] [--render-ms 200]
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from PIL import Image as PILImage
+
+from bench.common import FIXTURE_DIR
+
+METRIC_TITLES = [
+    "搜索人气", "搜索热度", "点击人气", "点击热度",
+    "点击率", "交易指数", "支付转化率", "商品指数", "飙升热度（%）"
+]
+IMAGE_FORMATS = ["jpg", "webp", "mpo"]
+CONTENT_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "mpo": "image/mpo"}
+
+# heavy 模式下商品页附带的资源；统计脚本先占用一段 CPU，再发一个埋点请求
+HEAVY_EXTRA = """
+  <style>@font-face {{ font-family: shop; src: url(/font/shop.woff2) format("woff2"); }}
+         body {{ font-family: shop, sans-serif; }}</style>
+  <div class="gallery">{images}</div>
+  <video src="/media/intro.mp4" preload="auto" muted></video>
+  <script src="/alilog/aplus_v2.js" async></script>
+"""
+ANALYTICS_JS = """
+const until = performance.now() + 40;
+while (performance.now() < until) {}
+new Image().src = "/alilog/log.gif?t=" + Date.now();
+"""
+GALLERY_IMAGES = 8
+
+
+def _template(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def metric_values(item_id: int, days: int) -> list:
+    """某个商品在近 days 天的指标，格式与线上页面一致（千分位、百分号）"""
+    rng = random.Random(item_id * 100 + days)
+    n = lambda lo, hi: f"{rng.randint(lo, hi) * days // 7:,}"
+    return [
+        n(100, 200_000), n(100, 500_000), n(10, 60_000), n(10, 60_000),
+        f"{rng.uniform(0.5, 20):.2f}%", n(100, 300_000), f"{rng.uniform(0.5, 20):.2f}%",
+        n(10, 10_000), f"{rng.uniform(-50, 400):.2f}",
+    ]
+
+
+def make_images(size: int = 400) -> dict:
+    """三种格式的商品图各一张：{"jpg": bytes, "webp": bytes, "mpo": bytes}"""
+    rng = random.Random(0)
+    small = PILImage.new("RGB", (size // 8, size // 8))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                   for _ in range((size // 8) ** 2)])
+    img = small.resize((size, size), PILImage.BICUBIC)
+    out = {}
+    for fmt, pil_fmt in (("jpg", "JPEG"), ("webp", "WEBP")):
+        buf = BytesIO()
+        img.save(buf, format=pil_fmt, quality=90)
+        out[fmt] = buf.getvalue()
+    buf = BytesIO()
+    try:
+        # 两帧的 MPO（与部分商家上传的相机原图一致）
+        img.save(buf, format="MPO", save_all=True, append_images=[img.rotate(90)], quality=90)
+    except (KeyError, ValueError, OSError):
+        buf = BytesIO(out["jpg"])  # 旧版 Pillow 不能写 MPO，退回 JPEG 内容
+    out["mpo"] = buf.getvalue()
+    return out
+
+
+class FixtureServer:
+    """
+    在后台线程中运行的替身服务器。latency 为每个请求的额外延迟（秒），
+    render_ms 为页面内异步渲染的延迟，pages × rows 为列表页的分页与每页行数。
+    """
+
+    def __init__(self, port=0, latency=0.0, render_ms=150, pages=3, rows=20, seconds=2, heavy=False):
+        self.latency = latency
+        self.heavy = heavy
+        self.render_ms = render_ms
+        self.pages = pages
+        self.rows = rows
+        self.tree = [{"label": f"一级{a}", "children": [
+            {"label": f"二级{a}-{b}", "children": [{"label": f"叶子{a}-{b}-{c}"} for c in range(3)]}
+            for b in range(seconds)]} for a in range(2)]
+        self.images = make_images()
+        self.list_html = _template("list.html")
+        self.item_html = _template("item.html")
+        self.item_api_html = _template("item_api.html")
+        rng = random.Random(1)
+        self.assets = {
+            "font": rng.randbytes(150 * 1024),
+            "media": rng.randbytes(2 * 1024 * 1024),
+        }
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ———— 页面 ————
+
+    def item_ids(self):
+        """列表页的全部商品编号（切换叶子时数据会错开，因此准备两倍的量）"""
+        return range(1, 2 * self.pages * self.rows + 1)
+
+    def list_page(self) -> str:
+        items = [{"link": f"{self.base_url}/item/{i}",
+                  "image": f"{self.base_url}/img/{i}.{IMAGE_FORMATS[i % len(IMAGE_FORMATS)]}",
+                  "name": f"商品{i}"} for i in self.item_ids()]
+        data = {"pages": self.pages, "rows": self.rows, "rows_total": self.pages * self.rows,
+                "render_ms": self.render_ms, "items": items, "tree": self.tree}
+        return self.list_html.replace("__DATA__", json.dumps(data, ensure_ascii=False))
+
+    def item_page(self, item_id: int) -> str:
+        data = {"name": f"商品{item_id}", "detail": f"https://item.taobao.com/item.htm?id={item_id}",
+                "titles": METRIC_TITLES, "render_ms": self.render_ms,
+                "values": {"7": metric_values(item_id, 7), "30": metric_values(item_id, 30)}}
+        page = self.item_html.replace("__DATA__", json.dumps(data, ensure_ascii=False))
+        if self.heavy:
+            images = "".join(f'<img src="/img/{item_id}.{IMAGE_FORMATS[n % len(IMAGE_FORMATS)]}?n={n}">'
+                             for n in range(GALLERY_IMAGES))
+            page = page.replace("<!--__EXTRA__-->", HEAVY_EXTRA.format(images=images))
+        return page
+
+    def item_api_page(self, item_id: int) -> str:
+        data = {"id": item_id, "name": f"商品{item_id}",
+                "detail": f"https://item.taobao.com/item.htm?id={item_id}",
+                "titles": METRIC_TITLES, "render_ms": self.render_ms}
+        return self.item_api_html.replace("__DATA__", json.dumps(data, ensure_ascii=False))
+
+    def metrics_json(self, item_id: int, days: int) -> str:
+        cards = [{"title": t, "value": v} for t, v in zip(METRIC_TITLES, metric_values(item_id, days))]
+        return json.dumps({"success": True, "data": {"offerId": item_id, "days": days, "cards": cards}},
+                          ensure_ascii=False)
+
+    def handle(self, req):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(req.path)
+        path = url.path
+        body, ctype = None, "text/html; charset=utf-8"
+        parts = path.strip("/").split("/")
+        try:
+            if parts[0] == "list":
+                body = self.list_page().encode("utf-8")
+            elif parts[0] == "item" and len(parts) == 2:
+                body = self.item_page(int(parts[1])).encode("utf-8")
+            elif parts[0] == "item_api" and len(parts) == 2:
+                body = self.item_api_page(int(parts[1])).encode("utf-8")
+            elif parts[:2] == ["api", "metrics"] and len(parts) == 3:
+                days = int(parse_qs(url.query).get("range", ["7"])[0])
+                if days not in (7, 30):
+                    raise ValueError(days)
+                body = self.metrics_json(int(parts[2]), days).encode("utf-8")
+                ctype = "application/json; charset=utf-8"
+            elif parts[0] == "img" and len(parts) == 2:
+                ext = parts[1].rsplit(".", 1)[-1]
+                body, ctype = self.images[ext], CONTENT_TYPES[ext]
+            elif parts[0] == "font":
+                body, ctype = self.assets["font"], "font/woff2"
+            elif parts[0] == "media":
+                body, ctype = self.assets["media"], "video/mp4"
+            elif path == "/alilog/aplus_v2.js":
+                body, ctype = ANALYTICS_JS.encode("utf-8"), "application/javascript"
+            elif path == "/alilog/log.gif":
+                body, ctype = b"GIF89a\x01\x00\x01\x00\x00\x00\x00;", "image/gif"
+        except (ValueError, KeyError):
+            body = None
+        if body is None:
+            req.send_error(404)
+            return
+        req.send_response(200)
+        req.send_header("Content-Type", ctype)
+        req.send_header("Content-Length", str(len(body)))
+        req.end_headers()
+        try:
+            req.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            return  # 浏览器中途放弃（例如视频只预读一部分）
+        with self._lock:
+            self.bytes_sent += len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 1688 替身服务器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.1, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--render-ms", type=int, default=200, help="页面内异步渲染延迟（毫秒）")
+    args = parser.parse_args()
+    with FixtureServer(args.port, args.latency, args.render_ms) as server:
+        print(f"列表页：{server.base_url}/list  商品页：{server.base_url}/item/1  （Ctrl+C 结束）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
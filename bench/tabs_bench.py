@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/tabs_bench.py：多标签页与多浏览器对比。同一批本地替身商品页，分别用
+一个浏览器 K 个标签页（pipeline.crawl_tabs）和 P 个各开一个标签页的浏览器（相当于 processing_quantity = P）爬取，
+报告每种设置的 页/秒、峰值内存（本进程 + chromedriver + 全部 Chrome 进程）和 每 GB 内存的 页/秒，并核对指标
+用法（项目根目录）：python -m bench.tabs_bench [--items 40] [--tabs 1,2,4,8] [--browsers 2,4] [--latency 0.2]
+"""
+
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pipeline
+from bench.common import make_driver, PeakRSS
+from bench.server import FixtureServer, metric_values, METRIC_TITLES
+
+
+def check(results, days):
+    return sum([d.get(k) for k in METRIC_TITLES] == metric_values(int(url.rsplit("/", 1)[-1]), int(days))
+               for url, d in results)
+
+
+def with_tabs(items, days, tabs):
+    """一个浏览器 tabs 个标签页；1 个标签页时就是原来的逐页 crawl_metrics_with_retry"""
+    driver = make_driver(tabs=tabs > 1)
+    try:
+        if tabs == 1:
+            return [(url, pipeline.crawl_metrics_with_retry(driver, url, days)) for url, _, _ in items]
+        return [(item[0], data) for item, data in pipeline.crawl_tabs(driver, items, days, tabs=tabs)]
+    finally:
+        driver.quit()
+
+
+def with_browsers(items, days, browsers):
+    """browsers 个浏览器各开一个标签页，轮流分配商品页"""
+    with ThreadPoolExecutor(browsers) as ex:
+        parts = ex.map(lambda i: with_tabs(items[i::browsers], days, 1), range(browsers))
+        return [r for part in parts for r in part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多标签页与多浏览器对比")
+    parser.add_argument("--items", type=int, default=40, help="商品页数")
+    parser.add_argument("--tabs", default="1,2,4,8", help="一个浏览器的标签页数，逗号分隔")
+    parser.add_argument("--browsers", default="2,4", help="对照组的浏览器数，逗号分隔")
+    parser.add_argument("--range", default="30", choices=["7", "30", "7+30"], help="时间范围")
+    parser.add_argument("--latency", type=float, default=0.2, help="服务器每个请求的额外延迟（秒）")
+    parser.add_argument("--render-ms", type=int, default=300, help="页面内异步渲染延迟（毫秒）")
+    args = parser.parse_args()
+
+    pipeline.NETWORK_CAPTURE = False
+    days = args.range.split("+")[-1]
+    settings = ([(f"1 浏览器 × {k} 标签页", with_tabs, int(k)) for k in args.tabs.split(",")]
+                + [(f"{p} 浏览器 × 1 标签页", with_browsers, int(p)) for p in args.browsers.split(",")])
+    rows, problems = [], []
+    with FixtureServer(latency=args.latency, render_ms=args.render_ms) as server:
+        items = [(f"{server.base_url}/item/{i}", "", ["bench"]) for i in range(1, args.items + 1)]
+        for name, fn, n in settings:
+            with PeakRSS() as rss:
+                start = time.perf_counter()
+                results = fn(items, args.range, n)
+                secs = time.perf_counter() - start
+            correct = check([(url, pipeline.window_view(d, days)) for url, d in results], days)
+            if correct != len(items):
+                problems.append(f"{name}：只有 {correct}/{len(items)} 页正确")
+            rows.append((name, len(items) / secs, rss.peak_mb, correct))
+            print(f"  {name} 完成，{secs:.1f}s")
+
+    print(f"\n{args.items} 页，近{args.range}天，延迟 {args.latency}s/请求，渲染 {args.render_ms}ms")
+    print(f"{'设置':<20}{'页/秒':>8}{'峰值内存(MB)':>14}{'页/秒/GB':>10}{'正确':>8}")
+    for name, rate, peak, correct in rows:
+        peak_s = f"{peak:.0f}" if peak is not None else "-"
+        per_gb = f"{rate / (peak / 1024):.2f}" if peak else "-"
+        print(f"{name:<20}{rate:>8.2f}{peak_s:>14}{per_gb:>10}{correct:>5}/{args.items}")
+    for p in problems:
+        print(f"[异常] {p}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
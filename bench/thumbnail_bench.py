@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/thumbnail_bench.py：同一批商品图分别以原图和缩略图嵌入 Excel，对比文件大小与保存耗时
+用法（项目根目录）：python -m bench.thumbnail_bench [行数] [原图边长]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from io import BytesIO
+
+import xlsxwriter
+from PIL import Image as PILImage
+
+import pipeline
+
+
+def fake_photo(rng, size):
+    """带噪点的渐变图，JPEG 压缩后的大小接近真实商品图"""
+    small = PILImage.new("RGB", (size // 8, size // 8))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                   for _ in range((size // 8) ** 2)])
+    img = small.resize((size, size), PILImage.BICUBIC)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def write_workbook(path, image_paths):
+    """与 pipeline.build_workbook 相同的写法，返回 (保存耗时, 文件大小)"""
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, pipeline.HEADERS)
+    ws.set_column(pipeline.IMAGE_COL, pipeline.IMAGE_COL, pipeline.COL_WIDTH)
+    for r, img_path in enumerate(image_paths, start=1):
+        ws.set_row(r, pipeline.ROW_HEIGHT)
+        ws.insert_image(r, pipeline.IMAGE_COL, img_path, pipeline.image_options(img_path))
+        ws.write_row(r, 1, [f"https://detail.tmall.com/item.htm?id={r}", "", f"商品{r}"])
+    start = time.perf_counter()
+    wb.close()
+    return time.perf_counter() - start, os.path.getsize(path)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 800
+    scale = pipeline.THUMB_SCALE or 2
+    pipeline.THUMB_SCALE = scale
+    rng = random.Random(0)
+
+    base = tempfile.mkdtemp(prefix="thumbnail_bench_")
+    try:
+        originals, thumbs = [], []
+        thumb_s = 0.0
+        for i in range(rows):
+            data = fake_photo(rng, size)
+            start = time.perf_counter()
+            thumb = pipeline.make_thumbnail(data)
+            thumb_s += time.perf_counter() - start
+            for paths, suffix, content in ((originals, "orig", data), (thumbs, "thumb", thumb)):
+                path = os.path.join(base, f"{i}.{suffix}")
+                with open(path, "wb") as f:
+                    f.write(content)
+                paths.append(path)
+
+        full_s, full_size = write_workbook(os.path.join(base, "original.xlsx"), originals)
+        small_s, small_size = write_workbook(os.path.join(base, "thumbnail.xlsx"), thumbs)
+
+        mb = 1024 * 1024
+        print(f"{rows} 行，原图 {size}×{size}，缩略图 "
+              f"{pipeline.IMAGE_SHOW_WIDTH * scale}×{pipeline.IMAGE_SHOW_HEIGHT * scale}")
+        print(f"原图：文件 {full_size / mb:.2f}MB，保存 {full_s:.2f}s")
+        print(f"缩略图：文件 {small_size / mb:.2f}MB，保存 {small_s:.2f}s（生成缩略图共 {thumb_s:.2f}s，在下载线程中完成）")
+        print(f"文件缩小 {(1 - small_size / full_size) * 100:.0f}%，保存加速 {full_s / small_s:.1f}x")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench/webdriver_commands.py：对比逐元素读取与批量脚本读取，每页发出的 WebDriver 命令数
+用法（项目根目录）：python -m bench.webdriver_commands
+"""
+
+from selenium.webdriver.common.by import By
+
+import crawler
+from bench.common import fixture_url, make_driver, CommandCounter
+
+
+def main():
+    driver = make_driver()
+    try:
+        driver.get(fixture_url("leaf.html"))
+        counter = CommandCounter(driver)
+
+        slow_rows, slow_n = counter.measure(crawler.extract_rows_slow, driver)
+        fast_rows, fast_n = counter.measure(crawler.extract_rows, driver)
+        assert slow_rows == fast_rows, "批量脚本与逐元素读取结果不一致"
+        print(f"表格 {len(fast_rows)} 行：逐元素 {slow_n} 次命令 -> 批量 {fast_n} 次命令")
+
+        wrappers = driver.find_elements(By.CSS_SELECTOR, crawler.waits.MENU_WRAPPER)
+        for level, wrapper in enumerate(wrappers, start=1):
+            items = wrapper.find_elements(By.CSS_SELECTOR, crawler.MENU_ITEM_CSS)
+            attr = "title" if level == 1 else None
+            slow, slow_n = counter.measure(crawler.item_labels_slow, items, attr)
+            fast, fast_n = counter.measure(crawler.item_labels, driver, items, attr)
+            assert slow == fast, f"第{level}级菜单文字不一致"
+            print(f"{level}级菜单 {len(items)} 项：逐元素 {slow_n} 次命令 -> 批量 {fast_n} 次命令")
+    finally:
+        driver.quit()
+
+
+if __name__ == '__main__':
+    main()
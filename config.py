@@ -5,17 +5,47 @@ config.py：提供大量请求头，防止平台检测到爬虫程序，从而
 
 time_range = "7" # 人为设置需要爬取的时间，另一个值是设置为7
 # 参考 可改成 ： time_range = "7"
+# 参考 可改成 ： time_range = "7+30"    每个商品页只加载一次，同时取近7天和近30天，各输出一个 Excel（文件名带 _近7天 / _近30天）
 
 category = "热销榜" # 人为设置‘热搜榜’，‘飙升榜’，‘热销榜’
 # 参考 可改成 ： category = "飙升榜"
 # 参考 可改成 ： category = "热销榜"
+# 参考 可改成 ： category = "热销榜+飙升榜+热搜榜"    同一浏览器会话里每个叶子类目依次切换各榜单抓取（CSV 文件名带 _榜单）
 
 processing_quantity = 2 # 多进程的数量，控制爬取速度，最好与网速和cpu性能挂钩
 # 参考 可改成 ： processing_quantity = 10
+adaptive_workers = 0 # 1 代表按可用内存、CPU 负载和单任务耗时在 worker_range 范围内自动增减浏览器进程（从 processing_quantity 个起步，需要 psutil），每次调整都打印原因；0 代表固定使用 processing_quantity 个
+worker_range = [1, 8] # 自动调整时浏览器进程数的下限和上限
+min_free_memory_mb = 1024 # 自动调整时给系统保留的可用内存（MB），低于该值时减少浏览器，新增浏览器后也不能低于该值
+
+image_concurrency = 8 # 每个解析进程后台并发下载图片的线程数，浏览器加载下一页时图片同时下载
+# 参考 可改成 ： image_concurrency = 16
+
+image_cache_mb = 2048 # 图片磁盘缓存上限（MB），同一图片只下载一次，重跑直接复用，0 代表关闭缓存
+
+thumbnail_scale = 2 # 图片下载后先缩成 显示尺寸(50×50) × 该倍数 再嵌入 Excel，文件小、保存快（2 在高分屏上也清晰），0 代表嵌入原图
+keep_originals = 1 # 缩略图模式下是否把原图留在图片缓存 image_cache/ 中（需开启缓存），1 代表保留，之后改倍数不用重新下载
+
+recycle_pages = 300 # 解析阶段每个浏览器加载多少个商品页后重启，防止 Chrome 内存越用越多
+recycle_memory_mb = 1500 # 单个浏览器内存超过该值（MB）时提前重启，0 代表不检查（需要 psutil）
+lean_browser = 1 # 1 代表解析阶段的浏览器不加载图片、音视频、字体和第三方统计脚本（指标卡片照常渲染），省带宽和 CPU；0 代表完整加载页面
+browser_tabs = 1 # 解析阶段每个浏览器同时开几个标签页轮流加载商品页，大于 1 时比多开进程省内存；1 代表逐页加载
+
+single_pass = 1 # 1 代表解析链接时直接计算‘总访客数’‘手淘占比’、去重并冻结表头，Excel 只写一次，无需再做最终处理；0 代表沿用旧流程
+
+dataset_sink = 1 # 1 代表解析结果同时写入 dataset/ 列式数据集（Parquet），可用 python dataset.py "飙升热度 > 100" 跨类目秒级查询
+
+streaming = 0 # 1 代表三个步骤同时运行：爬好一个叶子 CSV 立即解析，生成一个 Excel 立即最终处理，总耗时接近最慢的一步；0 代表依次运行
+stream_workers = [2, 2, 2, 2] # 流式模式下各步骤的进程数：爬取链接浏览器、解析链接浏览器、写 Excel、最终处理
+
+daemon_browsers = 2 # 常驻服务模式（python daemon.py serve）预热的浏览器数量，任务之间保持打开
+daemon_port = 8770 # 常驻服务监听的本机端口
+
+network_capture = 0 # 1 代表从商品页的数据接口响应中直接读取指标（Chrome 网络日志），数据一到即返回，读不到时退回解析页面（只在 browser_tabs = 1 时生效）；0 代表只解析页面
 
 is_head = True # 是否有头，True代表有头，False代表无头
 
-operation_steps = [1,1,1] # 分别对应‘爬取链接’，‘解析链接’，‘最终处理’， 1对应进行该步骤，0代表不进行
+operation_steps = [1,1,1] # 分别对应‘爬取链接’，‘解析链接’，‘最终处理’， 1对应进行该步骤，0代表不进行（single_pass = 1 时自动跳过最终处理）
 
 
 # ——————————————————————————————————————————————————————
@@ -2,17 +2,24 @@
 # -*- coding: utf-8 -*-
 """
 second_gen_crawler.py：按照 Excel 指示，对准备爬取的一级类目执行爬虫
-CSV 重复跳过；并行地对各一级分类分别启动浏览器执行爬取，并跳过已经爬取的类目
-一级分类全部文件爬取完毕后各自修改 Excel 第三列
+CSV 重复跳过；按（一级，二级）类目切分任务，由固定数量的常驻浏览器进程从共享队列领取，
+每个分片直接定位到自己的二级子树，总耗时取决于最大的二级类目而不是最大的一级类目
+一级分类全部分片爬取完毕后记入任务状态库（task_state.db），主进程结束时统一写回 Excel 第三列
+首次遍历级联菜单后把类目树缓存到 category_tree/，之后按下标路径直接定位叶子
+流式模式（config.streaming = 1）下每写完一个叶子 CSV 就发布到 manifest，解析链接阶段立即领取
+（python crawler.py --plan 只打印工作量估算）
 """
 
 import os
+import sys
 import csv
+import json
 import time
 import subprocess
-from multiprocessing import Pool, cpu_count
+from itertools import groupby
+from queue import Empty
+from multiprocessing import Process, Queue, cpu_count
 
-from openpyxl import load_workbook
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -20,8 +27,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 
-from config import category, is_head, processing_quantity
+import waits
+import autoscale
+import manifest
+import task_state
+import telemetry
+from config import category, is_head, processing_quantity, streaming, stream_workers
 
 # ———— 配置 ————
 PAGE_URL         = ("https://air.1688.com/app/fuwu-assets/work-buyer-plugin-frame"
@@ -30,8 +43,16 @@ PAGE_URL         = ("https://air.1688.com/app/fuwu-assets/work-buyer-plugin-fram
 OUTPUT_XLSX      = "一级类目.xlsx"
 CHROMEDRIVER_PATH = os.path.join(os.path.dirname(__file__),
                                   "chromedriver-win64", "chromedriver.exe")
-# 并行进程数
-PROCESS_COUNT    = min(processing_quantity, cpu_count())
+# 流式模式：每写完一个叶子 CSV 就发布到 manifest，解析链接阶段同时领取
+STREAMING        = streaming == 1
+# 并行浏览器进程数
+PROCESS_COUNT    = stream_workers[0] if STREAMING else min(processing_quantity, cpu_count())
+# 类目树缓存目录（每个一级类目一个 JSON）及有效期
+TREE_DIR         = "category_tree"
+TREE_MAX_AGE_DAYS = 7
+# 榜单：category 可写成 "热销榜+飙升榜"，同一浏览器会话里每个叶子类目依次切换各榜单抓取，
+# 此时 CSV 文件名带 "_榜单" 后缀；页面打开后默认停在第一个榜单
+BOARDS           = category.split("+")
 # —————————————————
 
 def find_chrome_path():
@@ -41,26 +62,105 @@ def find_chrome_path():
     except Exception:
         return r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 
-CHROME_EXE = find_chrome_path()
-print(f"[信息] Chrome 路径自动识别为: {CHROME_EXE}")
+_chrome_exe = None
+
+def chrome_exe():
+    """Chrome 路径：第一次用到时才执行 where chrome，导入本模块（包括每个子进程）时不再查找"""
+    global _chrome_exe
+    if _chrome_exe is None:
+        _chrome_exe = find_chrome_path()
+        print(f"[信息] Chrome 路径自动识别为: {_chrome_exe}")
+    return _chrome_exe
+
+ROW_IMG_CSS   = "tbody.next-channel-table-body tr.next-channel-table-row img.offer-img"
+MENU_ITEM_CSS = "li.next-channel-menu-item"
+
+# 一次 execute_script 取回整页的 (商品链接, 图片链接)
+ROWS_JS = """
+return Array.from(document.querySelectorAll(arguments[0]), img => {
+    const a = img.closest('a');
+    return a ? [a.href, img.src] : null;
+}).filter(Boolean);
+"""
+
+# 一次 execute_script 取回一组菜单项的文字（attr 为空时）或属性值
+LABELS_JS = """
+const attr = arguments[1];
+return arguments[0].map(li => {
+    if (attr) return (li.getAttribute(attr) || '').trim();
+    const t = li.querySelector('.next-channel-menu-item-text');
+    return t ? t.innerText.trim() : '';
+});
+"""
+
+def extract_rows_slow(driver):
+    """逐个元素读取：每个商品 3 次 WebDriver 请求，仅在批量脚本失败时使用"""
+    results = []
+    for img in driver.find_elements(By.CSS_SELECTOR, ROW_IMG_CSS):
+        try:
+            href = img.find_element(By.XPATH, "./ancestor::a").get_attribute("href")
+            src  = img.get_attribute("src")
+            results.append((href, src))
+        except:
+            pass
+    return results
+
+def extract_rows(driver):
+    """当前页所有商品的 (链接, 图片)，一次脚本调用取回"""
+    try:
+        rows = driver.execute_script(ROWS_JS, ROW_IMG_CSS)
+        if rows is not None:
+            return [tuple(r) for r in rows]
+    except WebDriverException:
+        pass
+    return extract_rows_slow(driver)
+
+def item_labels_slow(items, attr=None):
+    if attr:
+        return [li.get_attribute(attr).strip() for li in items]
+    return [li.find_element(By.CSS_SELECTOR, ".next-channel-menu-item-text").text.strip()
+            for li in items]
+
+def item_labels(driver, items, attr=None):
+    """菜单项文字（或 attr 属性）列表，一次脚本调用取回，失败时逐个读取"""
+    if not items:
+        return []
+    try:
+        labels = driver.execute_script(LABELS_JS, items, attr)
+        if labels is not None and len(labels) == len(items):
+            return labels
+    except WebDriverException:
+        pass
+    return item_labels_slow(items, attr)
 
 def open_category_popup(driver):
     try:
         sel = driver.find_element(By.CSS_SELECTOR, ".next-channel-select-inner")
         if sel.get_attribute("aria-expanded") != "true":
             ActionChains(driver).move_to_element(sel).click().perform()
-            time.sleep(1)
+            waits.wait_for(driver, waits.menu_wrappers_at_least(1), "弹出类目菜单")
     except:
         pass
 
-def scrape_leaf(driver, folder, label):
+def leaf_csv_path(folder, label, board=None):
+    name = label.replace('/', '_')
+    if len(BOARDS) > 1:
+        name += f"_{board or BOARDS[0]}"
+    return os.path.join(folder, f"{name}.csv")
+
+def leaf_done(folder, label):
+    """该叶子所有榜单的 CSV 都已存在"""
+    return all(os.path.exists(leaf_csv_path(folder, label, b)) for b in BOARDS)
+
+def scrape_leaf(driver, folder, label, board=None):
     os.makedirs(folder, exist_ok=True)
-    out = os.path.join(folder, f"{label.replace('/', '_')}.csv")
+    out = leaf_csv_path(folder, label, board)
     # CSV 已存在，就跳过
     if os.path.exists(out):
         return
 
-    print(f"  -> [叶子] 抓取分类 {label}")
+    print(f"  -> [叶子] 抓取分类 {label}" + (f"（{board}）" if board else ""))
+    start = time.perf_counter()
     results = []
     try:
         pg = driver.find_element(By.CSS_SELECTOR, "span.next-channel-pagination-display")
@@ -70,117 +170,242 @@ def scrape_leaf(driver, folder, label):
 
     for p in range(1, total + 1):
         print(f"    第 {p}/{total} 页", end="")
-        imgs = driver.find_elements(
-            By.CSS_SELECTOR,
-            "tbody.next-channel-table-body tr.next-channel-table-row img.offer-img"
-        )
-        for img in imgs:
-            try:
-                href = img.find_element(By.XPATH, "./ancestor::a").get_attribute("href")
-                src  = img.get_attribute("src")
-                results.append((href, src))
-            except:
-                pass
+        results.extend(extract_rows(driver))
         if p < total:
             try:
                 btn = driver.find_element(By.XPATH, f"//button[span[text()='{p+1}']]")
+                before = waits.table_signature(driver)
                 btn.click()
-                time.sleep(0.8)
+                if waits.wait_for(driver, waits.pagination_shows(p + 1), "翻页"):
+                    waits.wait_for(driver, waits.table_changed(before), "翻页表格刷新")
             except:
                 pass
         print(f" 累计 {len(results)} 条")
 
-    # 写CSV
-    with open(out, "w", newline="", encoding="utf-8-sig") as f:
+    # 写CSV：先写临时文件再改名，同时在扫描目录的解析阶段不会读到写了一半的文件
+    tmp = out + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8-sig") as f:
         w = csv.writer(f)
         w.writerow(["Link", "Image"])
         w.writerows(results)
+    os.replace(tmp, out)
+    telemetry.event("leaf", time.perf_counter() - start, rows=len(results), pages=total)
     print(f"    ✅ 已保存 {out}")
+    if STREAMING:
+        manifest.publish("csv", os.path.normpath(out))
 
-def scrape_products(driver, second_text, third_items, first_level_folder):
-    base_folder = os.path.join("product_link", first_level_folder,
-                               second_text.replace("/", "_"))
-    os.makedirs(base_folder, exist_ok=True)
-
-    texts = [li.find_element(By.CSS_SELECTOR, ".next-channel-menu-item-text").text.strip()
-             for li in third_items]
-    for third_text in texts:
-        print(f"  -> 抓取 {second_text} > {third_text}")
-        open_category_popup(driver)
-        wrappers = driver.find_elements(
-            By.CSS_SELECTOR,
-            ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
-        )
-        # 选二级
-        for li in wrappers[1].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item"):
-            if li.find_element(By.CSS_SELECTOR, ".next-channel-menu-item-text").text.strip() == second_text:
-                try:
-                    WebDriverWait(driver,5).until(EC.element_to_be_clickable(li))
-                    li.click(); time.sleep(0.5)
-                except:
-                    pass
-                break
-        # 选三级
-        wrappers = driver.find_elements(
-            By.CSS_SELECTOR,
-            ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
-        )
-        target = None
-        for li in wrappers[2].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item"):
-            if li.find_element(By.CSS_SELECTOR, ".next-channel-menu-item-text").text.strip() == third_text:
-                target = li; break
-        if not target:
-            print(f"    [跳过] 找不到三级分类 {third_text}")
-            continue
+def menu_items(driver, level):
+    """弹出层中第 level 列（0 起）的全部菜单项"""
+    wrappers = driver.find_elements(By.CSS_SELECTOR, waits.MENU_WRAPPER)
+    if len(wrappers) <= level:
+        return []
+    return wrappers[level].find_elements(By.CSS_SELECTOR, MENU_ITEM_CSS)
+
+def click_item(driver, li, name, leaf=False, columns=None, child=None):
+    """
+    点击菜单项；叶子等待表格刷新，非叶子等待级联菜单展开到 columns 列且新列已渲染。
+    已知类目树时传入 child（下一列应有的菜单项文字），等到新列出现该项为止
+    """
+    WebDriverWait(driver,5).until(EC.element_to_be_clickable(li))
+    if leaf:
+        before = waits.table_signature(driver)
+        li.click()
+        waits.wait_for(driver, waits.table_changed(before), name)
+    else:
+        before = waits.cascader_signature(driver)
+        li.click()
+        ready = waits.menu_has(columns - 1, child) if child else waits.cascader_expanded(columns, before)
+        waits.wait_for(driver, ready, name)
+
+# ———— 类目树缓存 ————
+
+def tree_path(first_folder):
+    return os.path.join(TREE_DIR, f"{first_folder}.json")
+
+def load_tree(first_folder):
+    """读取一级类目的缓存树；不存在或超过有效期返回 None"""
+    path = tree_path(first_folder)
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - tree.get("saved_at", 0) > TREE_MAX_AGE_DAYS * 86400:
+        return None
+    return tree
+
+def save_tree(first_folder, tree):
+    os.makedirs(TREE_DIR, exist_ok=True)
+    tree["saved_at"] = time.time()
+    tmp = tree_path(first_folder) + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(tree, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, tree_path(first_folder))
+
+def invalidate_tree(first_folder):
+    """页面上的类目与缓存对不上时删除缓存，下次运行重新遍历"""
+    try:
+        os.remove(tree_path(first_folder))
+    except OSError:
+        pass
+
+def discover_tree(driver, cat_name):
+    """
+    完整遍历一次某个一级类目下的级联菜单，记录二、三级的文字与下标：
+    {"label": 一级, "index": i, "children": [{"label": 二级, "index": j, "children": [...]}]}
+    """
+    open_category_popup(driver)
+    firsts = menu_items(driver, 0)
+    titles = item_labels(driver, firsts, attr="title")
+    if cat_name not in titles:
+        print(f"Error: 找不到一级类目 {cat_name}")
+        return None
+    i1 = titles.index(cat_name)
+    click_item(driver, firsts[i1], "展开一级类目", columns=2)
+
+    tree = {"label": cat_name, "index": i1, "children": []}
+    seconds = item_labels(driver, menu_items(driver, 1))
+    for i2, second_text in enumerate(seconds):
+        items = menu_items(driver, 1)
+        if len(items) <= i2:
+            # 点过没有三级的二级类目后弹出层会关闭，重新展开
+            open_category_popup(driver)
+            items = menu_items(driver, 1)
+            if len(items) <= i2:
+                click_item(driver, menu_items(driver, 0)[i1], "展开一级类目", columns=2)
+                items = menu_items(driver, 1)
         try:
-            WebDriverWait(driver,5).until(EC.element_to_be_clickable(target))
-            target.click(); time.sleep(0.5)
+            click_item(driver, items[i2], "展开二级类目", columns=3)
         except Exception as e:
-            print(f"    [跳过] 点击三级分类失败：{e}")
+            print(f"  [跳过] 点击二级分类失败：{second_text} {e}")
             continue
+        thirds = item_labels(driver, menu_items(driver, 2))
+        tree["children"].append({
+            "label": second_text, "index": i2,
+            "children": [{"label": t, "index": i3, "children": []} for i3, t in enumerate(thirds)],
+        })
+        print(f"  [类目树] {cat_name} > {second_text}：{len(thirds)} 个三级类目")
+    return tree
 
-        scrape_leaf(driver, base_folder, third_text)
+def get_tree(driver, cat_name, first_folder):
+    """优先使用缓存树，没有缓存时现场遍历并保存"""
+    tree = load_tree(first_folder)
+    if tree is None:
+        tree = discover_tree(driver, cat_name)
+        if tree is not None:
+            save_tree(first_folder, tree)
+    return tree
 
-def select_categories(driver, first_level_folder):
-    open_category_popup(driver)
-    wrappers = driver.find_elements(
-        By.CSS_SELECTOR,
-        ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
-    )
-    if len(wrappers) < 2:
-        print("Error: 找不到二级菜单容器")
-        return
+def iter_leaves(tree, first_folder):
+    """按顺序给出每个叶子：(下标路径, 文字路径, 输出目录, 叶子名)"""
+    for second in tree["children"]:
+        folder = os.path.join("product_link", first_folder,
+                              second["label"].replace("/", "_"))
+        # 无第三级时二级本身就是叶子
+        for third in second["children"] or [None]:
+            nodes = [tree, second] + ([third] if third else [])
+            yield ([n["index"] for n in nodes], [n["label"] for n in nodes],
+                   folder, nodes[-1]["label"])
 
-    second_items = wrappers[1].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item")
-    for li in second_items:
-        second_text = li.find_element(By.CSS_SELECTOR, ".next-channel-menu-item-text").text.strip()
-        print(f"\n=== 处理二级分类：{second_text} ===")
+def navigate(driver, path, labels):
+    """按缓存的下标路径逐级点击，每一级先核对文字；对不上返回 False。已经展开到下一级的不再点击"""
+    open_category_popup(driver)
+    for level, (idx, label) in enumerate(zip(path, labels)):
+        items = menu_items(driver, level)
+        attr = "title" if level == 0 else None
+        if idx >= len(items) or item_labels(driver, [items[idx]], attr)[0] != label:
+            return False
+        leaf = level == len(path) - 1
+        child = None if leaf else labels[level + 1]
+        if child and waits.menu_has(level + 1, child)(driver):
+            continue  # 重新打开的弹出层保留了已展开的列，下一列已有要找的子类目时不用再点
         try:
-            WebDriverWait(driver,5).until(EC.element_to_be_clickable(li))
-            li.click(); time.sleep(0.5)
+            click_item(driver, items[idx], "切换叶子类目" if leaf else f"展开{level + 1}级类目",
+                       leaf=leaf, columns=level + 2, child=child)
         except Exception as e:
-            print(f"  [跳过] 点击二级分类失败：{e}")
-            open_category_popup(driver)
-            continue
+            print(f"    [跳过] 点击类目失败：{' > '.join(labels)} {e}")
+            return False
+    return True
 
-        wrappers = driver.find_elements(
-            By.CSS_SELECTOR,
-            ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
-        )
-        # 无第三级
-        if len(wrappers) < 3 or not wrappers[2].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item"):
-            folder = os.path.join("product_link", first_level_folder,
-                                  second_text.replace("/", "_"))
-            scrape_leaf(driver, folder, second_text)
-        else:
-            third_items = wrappers[2].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item")
-            scrape_products(driver, second_text, third_items, first_level_folder)
+def select_categories(driver, tree, first_folder):
+    """
+    按缓存树的下标路径直接定位到每个叶子类目并抓取，已有 CSV 的叶子不再点击。
+    多榜单时定位到叶子后依次切换各榜单抓取（从当前所在的榜单开始），结束时切回第一个榜单。
+    二、三级任务的开始/完成/失败写入任务状态库。全部叶子成功返回 True。
+    """
+    cat_name = tree["label"]
+    ok = True
+    current = BOARDS[0]
+    for second, leaves in groupby(iter_leaves(tree, first_folder), key=lambda x: x[1][1]):
+        leaves = list(leaves)
+        has_third = len(leaves[0][1]) > 2
+        if has_third:
+            task_state.start(cat_name, second)
+        failed = 0
+        for path, labels, folder, leaf in leaves:
+            third = labels[2] if has_third else ""
+            if leaf_done(folder, leaf):
+                continue
+            print(f"  -> 抓取 {' > '.join(labels[1:])}")
+            task_state.start(cat_name, second, third)
+            if not navigate(driver, path, labels):
+                print(f"    [跳过] 类目树与页面不一致，已清除缓存：{' > '.join(labels)}")
+                invalidate_tree(first_folder)
+                task_state.fail(cat_name, second, third, error="类目树与页面不一致")
+                failed += 1
+                continue
+            try:
+                for board in [current] + [b for b in BOARDS if b != current]:
+                    if os.path.exists(leaf_csv_path(folder, leaf, board)):
+                        continue
+                    if board != current:
+                        select_board(driver, board)
+                        current = board
+                    scrape_leaf(driver, folder, leaf, board)
+            except Exception as e:
+                task_state.fail(cat_name, second, third, error=e)
+                raise
+            task_state.finish(cat_name, second, third)
+        if has_third:
+            if failed:
+                task_state.fail(cat_name, second, error=f"{failed} 个叶子类目失败")
+            else:
+                task_state.finish(cat_name, second)
+        ok = ok and not failed
+    if current != BOARDS[0]:
+        select_board(driver, BOARDS[0])
+    return ok
 
-        open_category_popup(driver)
+def shards_of(tree, first_folder):
+    """
+    把一级类目树按二级类目切成分片：每个分片是只含一个二级子树的树，下标路径不变，
+    可直接交给 select_categories。跳过叶子已全部完成的二级，返回 [(待爬叶子数, 分片), ...]
+    """
+    shards = []
+    for second in tree["children"]:
+        shard = dict(tree, children=[second])
+        left = sum(not leaf_done(folder, leaf)
+                   for _, _, folder, leaf in iter_leaves(shard, first_folder))
+        if left:
+            shards.append((left, shard))
+    return shards
+
+def plan(tasks):
+    """根据缓存树估算工作量：每个一级类目的二级数、叶子数、已完成 CSV 数"""
+    for cat_name, _ in tasks:
+        first_folder = cat_name.replace("/", "_")
+        tree = load_tree(first_folder)
+        if tree is None:
+            print(f"[规划] {cat_name}：无类目树缓存，运行时遍历")
+            continue
+        leaves = list(iter_leaves(tree, first_folder))
+        done = sum(leaf_done(folder, leaf) for _, _, folder, leaf in leaves)
+        shards = shards_of(tree, first_folder)
+        largest = max((n for n, _ in shards), default=0)
+        print(f"[规划] {cat_name}：二级 {len(tree['children'])} 个，叶子 {len(leaves)} 个，"
+              f"已完成 {done} 个，待爬 {len(leaves) - done} 个（{len(shards)} 个分片，最大 {largest} 个叶子）")
 
-def worker(args):
-    """每个进程处理一个一级类目"""
-    cat_name, row_idx = args
+def make_driver():
     driver_opts = Options()
     if is_head == True:
         pass
@@ -188,75 +413,191 @@ def worker(args):
         driver_opts.add_argument("--headless")  # ✅无头
     driver_opts.add_argument("--no-sandbox")
     driver_opts.add_argument("--disable-blink-features=AutomationControlled")
-    driver = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH), options=driver_opts)
+    return webdriver.Chrome(service=Service(CHROMEDRIVER_PATH), options=driver_opts)
+
+def open_list_page(driver, board=None):
+    """打开首页，切到 趋势热品 和指定榜单（默认为配置中的第一个榜单）"""
+    board = board or BOARDS[0]
+    with telemetry.timer("driver_get"):
+        driver.get(PAGE_URL)
+    waits.wait_for(driver, waits.element_present("div.next-channel-radio-group"), "打开首页", timeout=15)
 
+    # 切换榜单
     try:
-        # 打开首页
-        driver.get(PAGE_URL); time.sleep(2)
+        rg = driver.find_element(By.CSS_SELECTOR, "div.next-channel-radio-group")
+        for lbl in rg.find_elements(By.CSS_SELECTOR, "span.next-channel-radio-label"):
+            if lbl.text.strip() == "趋势热品":
+                lbl.click(); break
+    except:
+        pass
 
-        # 切换榜单
-        try:
-            rg = driver.find_element(By.CSS_SELECTOR, "div.next-channel-radio-group")
-            for lbl in rg.find_elements(By.CSS_SELECTOR, "span.next-channel-radio-label"):
-                if lbl.text.strip() == "趋势热品":
-                    lbl.click(); time.sleep(0.5); break
-        except:
-            pass
+    select_board(driver, board)
 
-        # 切 tabs
-        WebDriverWait(driver,10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "ul.next-channel-tabs-nav"))
-        )
-        tab = driver.find_element(
-            By.XPATH,
-            f"//ul[contains(@class,'next-channel-tabs-nav')]"
-            f"/li[.//div[text()='{category}']]"
-        )
-        tab.click(); time.sleep(0.5)
-
-        print(f"\n>> 开始一级类目：{cat_name}")
-        first_folder = cat_name.replace("/", "_")
-        # 点击一级分类
-        open_category_popup(driver)
-        wrappers = driver.find_elements(
-            By.CSS_SELECTOR,
-            ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
-        )
-        for li in wrappers[0].find_elements(By.CSS_SELECTOR, "li.next-channel-menu-item"):
-            if li.get_attribute("title").strip() == cat_name:
-                WebDriverWait(driver,5).until(EC.element_to_be_clickable(li))
-                li.click(); time.sleep(0.5)
+def select_board(driver, board):
+    """切换到 热销榜 / 热搜榜 / 飙升榜 等榜单 tab"""
+    WebDriverWait(driver,10).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, "ul.next-channel-tabs-nav"))
+    )
+    tab = driver.find_element(
+        By.XPATH,
+        f"//ul[contains(@class,'next-channel-tabs-nav')]"
+        f"/li[.//div[text()='{board}']]"
+    )
+    before = waits.table_signature(driver)
+    tab.click()
+    waits.wait_for(driver, waits.table_changed(before), "切换榜单")
+
+def shard_worker(todo, results, worker_id, stop=None, stats=None):
+    """
+    常驻子进程入口：浏览器只打开一次，反复从共享队列领取任务。
+    任务为 (一级类目, None) 时遍历类目树，为 (一级类目, 分片) 时爬取该二级子树；
+    出错后重开浏览器继续领取下一个任务。
+    由自动伸缩进程池启动时（stop、stats），被要求退役后做完当前分片再退出，并回报分片内平均每个叶子的耗时。
+    """
+    driver = None
+    try:
+        while True:
+            item = autoscale.next_task(todo, stop, stats)
+            if item is None:
                 break
+            cat_name, shard = item
+            first_folder = cat_name.replace("/", "_")
+            try:
+                if driver is None:
+                    driver = make_driver()
+                    open_list_page(driver)
+                if shard is None:
+                    print(f"\n>> 遍历一级类目：{cat_name}")
+                    results.put(("tree", cat_name, get_tree(driver, cat_name, first_folder)))
+                else:
+                    print(f"\n>> [进程{worker_id}] 开始分片：{cat_name} > {shard['children'][0]['label']}")
+                    left = sum(not leaf_done(folder, leaf)
+                               for _, _, folder, leaf in iter_leaves(shard, first_folder))
+                    start = time.perf_counter()
+                    ok = select_categories(driver, shard, first_folder)
+                    autoscale.report(stats, (time.perf_counter() - start) / max(left, 1))
+                    results.put(("shard", cat_name, ok))
+            except Exception as e:
+                print(f"[错误] 进程{worker_id} 处理 {cat_name} 失败：{e}")
+                results.put(("tree" if shard is None else "shard", cat_name, None if shard is None else False))
+                # 浏览器状态不明，重开后再领下一个任务
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+    finally:
+        waits.report(prefix=f"[进程{worker_id}] ")
+        if driver is not None:
+            driver.quit()
 
-        # 爬二三级
-        select_categories(driver, first_folder)
+def run_shards(tasks, workers=None):
+    """
+    一级类目先取类目树（无缓存的交给浏览器遍历），再按二级切成分片放入共享队列，
+    待爬叶子多的分片先领取。某个一级的分片全部结束后记录一级类目的完成/失败。
+    不指定 workers 且开启 adaptive_workers 时由 autoscale 按资源增减进程数，否则固定 workers（默认 PROCESS_COUNT）个。
+    """
+    todo, results = Queue(), Queue()
+    outstanding, failed = {}, set()
+    shards = []
+    queued = 0  # 放入队列的任务总数，减去已领取数即排队数
+    for cat_name, _ in tasks:
+        task_state.start(cat_name)
+        tree = load_tree(cat_name.replace("/", "_"))
+        if tree is None:
+            todo.put((cat_name, None))  # 遍历任务排在最前面，尽早放出它的分片
+            queued += 1
+            outstanding[cat_name] = 1
+        else:
+            shards += [(n, cat_name, shard) for n, shard in shards_of(tree, cat_name.replace("/", "_"))]
+            outstanding[cat_name] = sum(1 for _, c, _ in shards if c == cat_name)
+    for _, cat_name, shard in sorted(shards, key=lambda x: x[0], reverse=True):
+        todo.put((cat_name, shard))
+        queued += 1
 
-        # 回写 Excel “完成” 标记
-        wb = load_workbook(OUTPUT_XLSX)
-        ws = wb.active
-        ws.cell(row=row_idx, column=3, value=1)
-        wb.save(OUTPUT_XLSX)
-        print(f"✅ 完成一级类目：{cat_name}")
+    def settle(cat_name):
+        if outstanding[cat_name]:
+            return
+        if cat_name in failed:
+            task_state.fail(cat_name, error="部分分片失败")
+        else:
+            task_state.finish(cat_name)
+            print(f"✅ 完成一级类目：{cat_name}")
 
+    for cat_name in list(outstanding):
+        settle(cat_name)
+
+    pool = procs = None
+    if workers is None and autoscale.ENABLED:
+        pool = autoscale.WorkerPool("爬取链接", shard_worker,
+                                    lambda i, stop, stats: (todo, results, i, stop, stats),
+                                    initial=PROCESS_COUNT).start()
+        alive = pool.alive
+    else:
+        procs = [Process(target=shard_worker, args=(todo, results, i)) for i in range(workers or PROCESS_COUNT)]
+        for p in procs:
+            p.start()
+        alive = lambda: any(p.is_alive() for p in procs)
+    try:
+        while any(outstanding.values()):
+            if pool is not None:
+                pool.tick(queued - pool.taken)
+            try:
+                kind, cat_name, result = results.get(timeout=60 if pool is None else 5)
+            except Empty:
+                if not alive():
+                    print("[错误] 浏览器进程全部退出，剩余分片下次运行再爬")
+                    break
+                continue
+            outstanding[cat_name] -= 1
+            if kind == "tree":
+                if result is None:
+                    failed.add(cat_name)
+                else:
+                    new = sorted(shards_of(result, cat_name.replace("/", "_")),
+                                 key=lambda x: x[0], reverse=True)
+                    for _, shard in new:
+                        todo.put((cat_name, shard))
+                    queued += len(new)
+                    outstanding[cat_name] += len(new)
+            elif not result:
+                failed.add(cat_name)
+            settle(cat_name)
     finally:
-        driver.quit()
+        if pool is not None:
+            pool.join()  # 各进程做完手上的分片后退出
+        else:
+            for _ in procs:
+                todo.put(None)  # 每个进程一个结束标记
+            for p in procs:
+                p.join()
 
 def main():
-    wb = load_workbook(OUTPUT_XLSX)
-    ws = wb.active
-
-    tasks = []
-    for i, row in enumerate(ws.iter_rows(min_row=2), start=2):
-        name = row[0].value
-        ready = row[1].value
-        if ready == 1:
-            tasks.append((name, i))
-
-    if not tasks:
-        print("没有待爬取的一级类目。")
-        return
+    chrome_exe()
+    if STREAMING and "--plan" not in sys.argv:
+        manifest.reopen("csv")
+    try:
+        # Excel 只在这里导入一次，进程之间通过任务状态库协调
+        task_state.import_excel(OUTPUT_XLSX)
+        tasks = task_state.pending_first_levels()
+
+        if not tasks:
+            print("没有待爬取的一级类目。")
+            return
+
+        plan(tasks)
+        if "--plan" in sys.argv:
+            return
+
+        try:
+            run_shards(tasks)
+        finally:
+            task_state.export_excel(OUTPUT_XLSX)
+            task_state.summary()
+    finally:
+        if STREAMING and "--plan" not in sys.argv:
+            # 不再有新的 CSV，解析链接阶段处理完剩余文件后退出
+            manifest.close("csv")
 
-    with Pool(PROCESS_COUNT) as pool:
-        pool.map(worker, tasks)
 if __name__ == '__main__':
     main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+daemon.py：常驻服务模式。模块只导入一次，浏览器池保持预热（已打开首页、切到 趋势热品 和榜单），
+         通过本机 HTTP 接口或命令行提交任务（一级类目 + 榜单 + 时间范围），白天反复跑的小任务几秒内即可开始
+         任务依次执行，每个任务在 daemon_jobs/<编号>/ 下有自己的 product_link/ 和 output/；
+         类目树、图片缓存、数据集和统计文件与普通运行共用项目目录下的同一份
+用法：python daemon.py serve                                                  启动服务
+      python daemon.py submit 女装/女士精品 [--board 热销榜+飙升榜] [--time-range 7+30] [--wait]   提交任务
+      python daemon.py status [任务编号]                                       查看任务状态
+HTTP：POST /jobs {"category": "...", "board": "...", "time_range": "7"}；GET /jobs；GET /jobs/<编号>；GET /health
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+
+import crawler
+import pipeline
+import dataset
+import image_cache
+import journal
+import telemetry
+from config import category, time_range, daemon_browsers, daemon_port
+
+# -------- 配置 --------
+JOBS_DIR   = os.path.abspath("daemon_jobs")
+BROWSERS   = daemon_browsers
+PORT       = daemon_port
+TIME_RANGES = ("7", "30", "7+30")
+# ----------------------
+
+ROOT = os.getcwd()
+
+
+def pin_shared_paths():
+    """任务在各自的目录中运行；类目树、图片缓存、数据集、统计文件仍然指向项目目录下的同一份"""
+    crawler.TREE_DIR = os.path.join(ROOT, crawler.TREE_DIR)
+    image_cache.CACHE_DIR = os.path.join(ROOT, image_cache.CACHE_DIR)
+    image_cache.INDEX_DB = os.path.join(ROOT, image_cache.INDEX_DB)
+    dataset.DATASET_DIR = os.path.join(ROOT, dataset.DATASET_DIR)
+    telemetry.TELEMETRY_DIR = os.path.join(ROOT, telemetry.TELEMETRY_DIR)
+    telemetry.PROM_FILE = os.path.join(ROOT, telemetry.PROM_FILE)
+
+
+# ———— 浏览器池 ————
+
+class Browser:
+    """一个常驻浏览器；board 记录当前停在哪个榜单的列表页，None 表示不在列表页"""
+
+    def __init__(self, idx):
+        self.idx = idx
+        self.driver = None
+        self.board = None
+        self.pages = 0
+
+    def alive(self) -> bool:
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _ensure(self):
+        if self.driver is not None and not self.alive():
+            print(f"[浏览器{self.idx}] 已断开，重新打开")
+            self.reset()
+        if self.driver is None:
+            self.driver = crawler.make_driver()
+            self.board, self.pages = None, 0
+        return self.driver
+
+    def list_page(self, board):
+        """停在指定榜单的列表页：已经在列表页只切 tab，不重新加载首页"""
+        driver = self._ensure()
+        if self.board is None:
+            crawler.open_list_page(driver, board)
+        elif self.board != board:
+            crawler.select_board(driver, board)
+        self.board = board
+        return driver
+
+    def item_page(self):
+        """用于打开商品页；离开列表页，下次需要时再加载首页。加载页数过多时先重启"""
+        if self.pages >= pipeline.RECYCLE_PAGES:
+            self.reset()
+        driver = self._ensure()
+        self.board = None
+        return driver
+
+    def reset(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver, self.board, self.pages = None, None, 0
+
+
+class BrowserPool:
+    def __init__(self, size):
+        self.browsers = [Browser(i) for i in range(size)]
+        self.idle = Queue()
+        for b in self.browsers:
+            self.idle.put(b)
+
+    def warm(self, board):
+        """启动时并行打开所有浏览器并停在列表页"""
+        def _warm(_):
+            self.run(lambda b: b.list_page(board))
+        with ThreadPoolExecutor(len(self.browsers)) as ex:
+            list(ex.map(_warm, self.browsers))
+
+    def run(self, fn):
+        """借一个空闲浏览器执行 fn(browser)；出错时重置该浏览器再把异常抛给调用方"""
+        b = self.idle.get()
+        try:
+            return fn(b)
+        except Exception:
+            b.reset()
+            raise
+        finally:
+            self.idle.put(b)
+
+    def map(self, fn, items):
+        """每个 item 借一个浏览器执行 fn(browser, item)，返回失败（抛异常或返回 False）的个数"""
+        def _one(item):
+            try:
+                return int(self.run(lambda b: fn(b, item)) is False)
+            except Exception as e:
+                print(f"[错误] {e}")
+                return 1
+        with ThreadPoolExecutor(len(self.browsers)) as ex:
+            return sum(ex.map(_one, items))
+
+    def warm_count(self) -> int:
+        return sum(b.board is not None for b in self.browsers)
+
+    def close(self):
+        for b in self.browsers:
+            b.reset()
+
+
+# ———— 任务 ————
+
+class Daemon:
+    def __init__(self, browsers=BROWSERS):
+        self.pool = BrowserPool(browsers)
+        self.jobs = {}
+        self.queue = Queue()
+        self.lock = threading.Lock()
+
+    def load_jobs(self):
+        """恢复以前的任务记录：排队中的重新排队，执行到一半的记为失败"""
+        if not os.path.isdir(JOBS_DIR):
+            return
+        for job_id in sorted(os.listdir(JOBS_DIR)):
+            try:
+                with open(os.path.join(JOBS_DIR, job_id, "job.json"), encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self.jobs[job["id"]] = job
+            if job["state"] == "queued":
+                self.queue.put(job["id"])
+            elif job["state"] == "running":
+                self.update(job, state="failed", error="服务在任务执行中退出")
+
+    def update(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+            folder = os.path.join(JOBS_DIR, job["id"])
+            os.makedirs(folder, exist_ok=True)
+            tmp = os.path.join(folder, "job.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, os.path.join(folder, "job.json"))
+
+    def submit(self, cat_name, board=category, time_range=time_range) -> dict:
+        if not cat_name:
+            raise ValueError("缺少一级类目")
+        if str(time_range) not in TIME_RANGES:
+            raise ValueError(f"time_range 只能是 {' / '.join(TIME_RANGES)}")
+        job = {"id": time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6],
+               "category": cat_name, "board": board, "time_range": str(time_range),
+               "state": "queued", "phase": None, "submitted_at": time.time(),
+               "started_at": None, "finished_at": None, "leaves": 0, "links": 0,
+               "workbooks": 0, "failures": 0, "error": None}
+        job["workspace"] = os.path.join(JOBS_DIR, job["id"])
+        self.jobs[job["id"]] = job
+        self.update(job)
+        self.queue.put(job["id"])
+        return job
+
+    def worker(self):
+        """任务线程：依次执行排队的任务"""
+        while True:
+            job = self.jobs[self.queue.get()]
+            started = time.time()
+            self.update(job, state="running", started_at=started)
+            telemetry.event("daemon.start_latency", started - job["submitted_at"])
+            try:
+                with telemetry.timer("daemon.job"):
+                    self.run_job(job)
+                self.update(job, state="done", phase=None)
+            except Exception as e:
+                print(f"[错误] 任务 {job['id']} 失败：{e}")
+                self.update(job, state="failed", error=str(e)[:500])
+            finally:
+                os.chdir(ROOT)
+                self.update(job, finished_at=time.time(), duration=time.time() - started)
+
+    def run_job(self, job):
+        """
+        本任务的榜单、时间范围写入 crawler / pipeline 的模块配置（任务依次执行），结束后恢复。
+        与命令行运行一样，每个任务结束（包括失败）时打印图片缓存命中率并按容量上限淘汰
+        """
+        crawler.BOARDS = job["board"].split("+")
+        pipeline.time_range, pipeline.category = job["time_range"], job["board"]
+        try:
+            self._run_job(job)
+        finally:
+            image_cache.report()  # 缓存目录固定在 ROOT 下，各任务共用同一个容量上限
+            crawler.BOARDS = category.split("+")
+            pipeline.time_range, pipeline.category = time_range, category
+
+    def _run_job(self, job):
+        os.makedirs(job["workspace"], exist_ok=True)
+        os.chdir(job["workspace"])
+        image_cache.reset_stats()
+        cat_name, board = job["category"], crawler.BOARDS[0]
+        first_folder = cat_name.replace("/", "_")
+
+        # 1) 爬取链接：类目树（有缓存直接用）-> 按二级分片分给预热的浏览器；多榜单时每个叶子在同一浏览器里切换榜单
+        self.update(job, phase="crawler")
+        tree = self.pool.run(lambda b: crawler.get_tree(b.list_page(board), cat_name, first_folder))
+        if tree is None:
+            raise ValueError(f"找不到一级类目 {cat_name}")
+        shards = [s for _, s in sorted(crawler.shards_of(tree, first_folder),
+                                       key=lambda x: x[0], reverse=True)]
+        failures = self.pool.map(
+            lambda b, shard: crawler.select_categories(b.list_page(board), shard, first_folder), shards)
+        tasks = pipeline.find_tasks()
+        self.update(job, leaves=len(tasks), failures=failures)
+
+        # 2) 解析链接：同一批浏览器打开商品页；"7+30" 时每页加载一次读两个窗口
+        self.update(job, phase="pipeline")
+        batches = pipeline.make_batches(pipeline.plan_tasks(tasks))
+        self.update(job, links=sum(len(b) for b in batches))
+
+        def crawl_batch(b, batch):
+            for page_url, image_url, csvs in batch:
+                data = pipeline.crawl_metrics_with_retry(b.item_page(), page_url, job["time_range"])
+                b.pages += 1
+                if any(v is not None for v in data.values()):
+                    journal.record_many(csvs, page_url, data, job["time_range"])
+        failures += self.pool.map(crawl_batch, batches)
+
+        # 3) 写 Excel：每个 CSV 每个时间窗口一个 Excel，数据集按窗口和榜单分区
+        self.update(job, phase="workbook", failures=failures)
+        for in_csv, out_xlsx in tasks:
+            pipeline.build_workbook(in_csv, out_xlsx)
+            self.update(job, workbooks=job["workbooks"] + 1)
+
+    def health(self) -> dict:
+        return {"browsers": len(self.pool.browsers), "warm": self.pool.warm_count(),
+                "queued": self.queue.qsize(),
+                "running": [j["id"] for j in self.jobs.values() if j["state"] == "running"]}
+
+
+def make_handler(daemon):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts == ["health"]:
+                self._send(200, daemon.health())
+            elif parts == ["jobs"]:
+                self._send(200, sorted(daemon.jobs.values(), key=lambda j: j["submitted_at"]))
+            elif len(parts) == 2 and parts[0] == "jobs" and parts[1] in daemon.jobs:
+                self._send(200, daemon.jobs[parts[1]])
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.strip("/") != "jobs":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("请求体必须是 JSON 对象")
+                job = daemon.submit(body.get("category"), body.get("board") or category,
+                                    body.get("time_range") or time_range)
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(202, job)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve():
+    pin_shared_paths()
+    daemon = Daemon()
+    daemon.load_jobs()
+    httpd = ThreadingHTTPServer(("127.0.0.1", PORT), make_handler(daemon))
+    print(f"[服务] 正在预热 {BROWSERS} 个浏览器……")
+    start = time.perf_counter()
+    daemon.pool.warm(category.split("+")[0])
+    print(f"[服务] 预热完成，用时 {time.perf_counter() - start:.1f}s，监听 http://127.0.0.1:{PORT}")
+    threading.Thread(target=daemon.worker, daemon=True).start()
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        daemon.pool.close()
+
+
+# ———— 命令行客户端 ————
+
+def call(method, path, body=None):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+    req = Request(f"http://127.0.0.1:{PORT}{path}", data=data, method=method,
+                  headers={"Content-Type": "application/json"})
+    try:
+        with urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read())
+    except HTTPError as e:
+        return json.loads(e.read())
+
+
+def show(job):
+    took = f"，用时 {job['duration']:.0f}s" if job.get("duration") else ""
+    phase = f"（{job['phase']}）" if job.get("phase") else ""
+    print(f"{job['id']}  {job['state']}{phase}  {job['category']} / {job['board']} / 近{job['time_range']}天  "
+          f"叶子 {job['leaves']}，链接 {job['links']}，Excel {job['workbooks']}，失败 {job['failures']}{took}"
+          + (f"  错误：{job['error']}" if job.get("error") else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻服务模式")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="启动服务")
+    p = sub.add_parser("submit", help="提交任务")
+    p.add_argument("category", help="一级类目，例如 女装/女士精品")
+    p.add_argument("--board", default=category, help="榜单，例如 热销榜，多个用 + 连接")
+    p.add_argument("--time-range", default=time_range, choices=TIME_RANGES)
+    p.add_argument("--wait", action="store_true", help="等待任务结束")
+    p = sub.add_parser("status", help="查看任务状态")
+    p.add_argument("job_id", nargs="?")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve()
+    elif args.cmd == "submit":
+        job = call("POST", "/jobs", {"category": args.category, "board": args.board,
+                                     "time_range": args.time_range})
+        if "error" in job:
+            print(f"提交失败：{job['error']}")
+            sys.exit(1)
+        show(job)
+        while args.wait and job["state"] in ("queued", "running"):
+            time.sleep(5)
+            job = call("GET", f"/jobs/{job['id']}")
+        if args.wait:
+            show(job)
+    else:
+        if args.job_id:
+            show(call("GET", f"/jobs/{args.job_id}"))
+        else:
+            print(json.dumps(call("GET", "/health"), ensure_ascii=False))
+            for job in call("GET", "/jobs"):
+                show(job)
+
+
+if __name__ == '__main__':
+    main()
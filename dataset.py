@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dataset.py：把解析出的每一行同时写入一个列式数据集（Parquet，按 一级类目/运行日期/时间范围/榜单 分区）
+         各进程各写各的分片文件，互不加锁；查询时按分区和数值条件下推过滤，不必再打开上千个 Excel
+用法：python dataset.py "飙升热度 > 100" [--first-level 女装_女士精品] [--category 热销榜] [--time-range 7]
+"""
+
+import os
+import re
+import uuid
+import argparse
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from final_process import safe_float, derive_metrics
+
+# -------- 配置 --------
+DATASET_DIR = "dataset"
+PARTITIONS  = ["first_level", "run_date", "time_range", "category"]
+METRIC_KEYS = [
+    "搜索人气", "搜索热度", "点击人气", "点击热度",
+    "点击率", "交易指数", "支付转化率", "商品指数", "飙升热度（%）"
+]
+SCHEMA = pa.schema(
+    [("二级类目", pa.string()), ("叶子类目", pa.string()),
+     ("链接", pa.string()), ("图片链接", pa.string()), ("商品名称", pa.string())]
+    + [(k, pa.float64()) for k in METRIC_KEYS]
+    + [("总访客数", pa.float64()), ("手淘占比", pa.float64())]
+)
+# ----------------------
+
+
+def _part_value(v) -> str:
+    return str(v).replace("/", "_").replace("=", "_")
+
+
+def to_record(second_level, leaf, image_url, data) -> dict:
+    """把一行指标转换成带类型的记录：数值列去掉千分位和百分号后存为 float"""
+    rec = {
+        "二级类目": second_level, "叶子类目": leaf,
+        "链接": data.get("链接"), "图片链接": image_url, "商品名称": data.get("商品名称"),
+    }
+    for k in METRIC_KEYS:
+        rec[k] = safe_float(data.get(k)) if data.get(k) is not None else None
+    total_visitors, taobao_ratio = derive_metrics(data.get("点击人气"), data.get("商品指数"),
+                                                  data.get("支付转化率"))
+    rec["总访客数"] = total_visitors
+    rec["手淘占比"] = taobao_ratio
+    return rec
+
+
+def write_rows(records, first_level, time_range, category, run_date=None, name=None):
+    """
+    写入一批记录，每次调用写一个分片文件，多个进程同时写入也不会冲突。返回写入的文件路径。
+    给定 name 时分片文件名固定为 part-{name}，同名分片整个覆盖（中断后重跑不会重复追加）；
+    否则文件名含进程号和随机串，每次都是新的分片。
+    """
+    if not records:
+        return None
+    run_date = run_date or date.today().isoformat()
+    folder = os.path.join(DATASET_DIR, *(
+        f"{k}={_part_value(v)}" for k, v in zip(PARTITIONS, (first_level, run_date, time_range, category))
+    ))
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"part-{name or f'{os.getpid()}-{uuid.uuid4().hex}'}.parquet")
+    table = pa.Table.from_pylist(records, schema=SCHEMA)
+    # 下划线开头的临时文件不会被数据集扫描到
+    tmp = os.path.join(folder, f"_{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)  # 读端只会看到完整的分片
+    return path
+
+
+def resolve_column(name: str) -> str:
+    """列名可只写前缀，例如 '飙升热度' -> '飙升热度（%）'"""
+    for field in SCHEMA.names + PARTITIONS:
+        if field == name:
+            return field
+    matches = [f for f in SCHEMA.names if f.startswith(name)]
+    if len(matches) != 1:
+        raise ValueError(f"无法识别的列名：{name}")
+    return matches[0]
+
+
+def parse_where(where: str):
+    """解析 '列名 运算符 数值'，例如 '飙升热度 > 100'，多个条件用 and 连接"""
+    expr = None
+    for part in re.split(r"\s+and\s+", where.strip(), flags=re.I):
+        m = re.fullmatch(r"\s*(.+?)\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+)\s*", part)
+        if not m:
+            raise ValueError(f"无法解析的条件：{part}")
+        field = ds.field(resolve_column(m.group(1)))
+        value = float(m.group(3))
+        cond = {">": field > value, ">=": field >= value, "<": field < value,
+                "<=": field <= value, "==": field == value, "!=": field != value}[m.group(2)]
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def load(where=None, columns=None, **partitions):
+    """
+    读取数据集的一个切片并返回 pandas DataFrame。
+    where 为 parse_where 支持的条件字符串；partitions 按分区过滤，例如 category="热销榜"。
+    """
+    partitioning = ds.partitioning(pa.schema([(p, pa.string()) for p in PARTITIONS]), flavor="hive")
+    dataset = ds.dataset(DATASET_DIR, format="parquet", partitioning=partitioning)
+    expr = parse_where(where) if where else None
+    for k, v in partitions.items():
+        if v is None:
+            continue
+        cond = ds.field(k) == _part_value(v)
+        expr = cond if expr is None else expr & cond
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按条件查询已爬取的数据集")
+    parser.add_argument("where", nargs="?", help="例如 \"飙升热度 > 100\"")
+    parser.add_argument("--first-level")
+    parser.add_argument("--run-date")
+    parser.add_argument("--time-range")
+    parser.add_argument("--category")
+    parser.add_argument("--out", help="保存为 CSV 的路径，不填则打印前 50 行")
+    args = parser.parse_args()
+
+    df = load(args.where, first_level=args.first_level, run_date=args.run_date,
+              time_range=args.time_range, category=args.category)
+    if args.out:
+        df.to_csv(args.out, index=False, encoding="utf-8-sig")
+        print(f"已导出 {len(df)} 行：{args.out}")
+    else:
+        print(df.head(50).to_string())
+        print(f"共 {len(df)} 行")
+
+
+if __name__ == '__main__':
+    main()
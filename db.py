@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+db.py：各 SQLite 存储（任务状态、解析日志、图片缓存索引、流式队列）共用的连接
+         （每个进程、每个线程各自的连接 + 按绝对路径区分 + WAL 多进程共享 + 首次连接时建表）
+"""
+
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(path: str, schema=()) -> sqlite3.Connection:
+    """
+    返回本线程连到 path 的连接，首次连接时开启 WAL 并依次执行 schema 中的语句。
+    fork 出来的子进程不能复用父进程的连接，按进程重新连接；相对路径按当前工作目录解析，
+    工作目录变了（常驻服务切换任务目录）时连到新目录下的库，并关闭旧目录下同名库的连接
+    """
+    path = os.path.abspath(path)
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.conns, _local.pid = {}, os.getpid()
+    name = os.path.basename(path)
+    cached = _local.conns.get(name)
+    if cached is not None and cached[0] == path:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for sql in schema:
+        conn.execute(sql)
+    _local.conns[name] = (path, conn)
+    return conn
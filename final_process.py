@@ -3,30 +3,61 @@
 """
 final_process.py：对解析之后的数据计算 ‘总访客数’，‘手淘占比’，删除重复数据行，并冻结表头
            —跳过读取失败的损坏文件并记录—
+           列式引擎：整列解析数值、向量化计算派生列、只回写变化的单元格，多进程并行处理文件
+           （pipeline 开启 single_pass 后派生列在写 Excel 时已算好，本模块只用于修复旧的输出文件）
+用法：python final_process.py           处理 output/ 下所有 Excel
+      python final_process.py --follow  流式模式，处理 pipeline 刚生成的 Excel，直到上游结束
 """
 
 
 import sys
 import os
 import csv
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
 from openpyxl import load_workbook
 
+import manifest
+import telemetry
+from config import stream_workers
+
 # 配置项
 INPUT_DIR = "output"
 BAD_RECORD_CSV = "损坏文件记录.csv"
+PROCESSES = os.cpu_count() or 1  # 纯 CPU 计算，按核数并行处理文件
+STREAM_PROCESSES = stream_workers[3]  # 流式模式下的进程数
 
 def safe_float(value):
     try:
         return float(str(value).replace(",", "").replace("%", "").strip())
-    except:
+    except (ValueError, TypeError):
         return None
 
-def safe_float(val):
-    try:
-        return float(str(val).replace('%', '').strip())
-    except (ValueError, TypeError):
+def derive_metrics(clicks, index, rate):
+    """由 点击人气、商品指数、支付转化率 计算 (总访客数, 手淘占比数值)，无法计算的为 None"""
+    clicks, index, rate = safe_float(clicks), safe_float(index), safe_float(rate)
+    total_visitors = index / (rate / 100) if rate and index is not None else None
+    taobao_ratio   = clicks / total_visitors if total_visitors and clicks is not None else None
+    return (round(total_visitors, 2) if total_visitors else None,
+            round(100 * taobao_ratio, 4) if taobao_ratio else None)
+
+def with_percent(val):
+    """非空值统一带百分号"""
+    if val is None:
         return None
+    s = str(val)
+    return s if s.endswith("%") else f"{s}%"
+
+def parse_numbers(col: pd.Series) -> np.ndarray:
+    """整列解析 '1,395,977'、'6%' 之类的字符串，与 safe_float 一致，无法解析的为 NaN"""
+    s = col.astype(str).str.replace(",", "", regex=False).str.replace("%", "", regex=False).str.strip()
+    out = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+    out[col.isna().to_numpy()] = np.nan
+    return out
 
 def process_excel(path):
     wb = load_workbook(path)
@@ -70,17 +101,11 @@ def process_excel(path):
         seen.add(sig)
 
         # 重新计算“总访客数” & “手淘占比”
-        clicks = safe_float(ws.cell(r, idx_clicks).value)
-        index  = safe_float(ws.cell(r, idx_index).value)
-        rate   = safe_float(ws.cell(r, idx_rate).value)
-
-        total_visitors = index / (rate / 100) if rate and rate != 0 else None
-        taobao_ratio   = clicks / total_visitors if total_visitors else None
-
-        ws.cell(row=r, column=idx_total_visitors,
-                value=round(total_visitors, 2) if total_visitors else None)
-        ws.cell(row=r, column=idx_taobao_ratio,
-                value=round(100 * taobao_ratio, 4) if taobao_ratio else None)
+        total_visitors, taobao_ratio = derive_metrics(ws.cell(r, idx_clicks).value,
+                                                      ws.cell(r, idx_index).value,
+                                                      ws.cell(r, idx_rate).value)
+        ws.cell(row=r, column=idx_total_visitors, value=total_visitors)
+        ws.cell(row=r, column=idx_taobao_ratio, value=taobao_ratio)
         # 去除“搜索热度”列中的百分号
         if idx_search_hot:
             val_h = ws.cell(row=r, column=idx_search_hot).value
@@ -108,30 +133,158 @@ def process_excel(path):
     wb.save(path)
     print(f"已处理：{path}")
 
+def process_excel_fast(path):
+    """
+    列式版 process_excel，结果与之逐格一致：
+    一次读出所有值 -> 向量化解析与计算 -> 只写回派生列和需要改格式的单元格。
+    """
+    wb = load_workbook(path)
+    ws = wb.active
+
+    # 冻结第一行
+    ws.freeze_panes = "A2"
+
+    # 确保“总访客数”“手淘占比”列存在
+    headers = [cell.value for cell in ws[1]]
+    for name in ("总访客数", "手淘占比"):
+        if name not in headers:
+            ws.cell(row=1, column=len(headers) + 1, value=name)
+            headers.append(name)
+    col_map = {name: idx for idx, name in enumerate(headers)}
+
+    values = list(ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=len(headers), values_only=True))
+    if not values:
+        wb.save(path)
+        print(f"已处理：{path}")
+        return
+    df = pd.DataFrame(values, columns=range(len(headers)), dtype=object)
+
+    # 唯一签名：除图片外所有单元格值（字符串去首尾空格），保留最下面的一行
+    sig = df.iloc[:, 1:].apply(lambda c: c.map(lambda v: v.strip() if isinstance(v, str) else v))
+    keep = ~sig.duplicated(keep="last").to_numpy()
+
+    # 重新计算“总访客数” & “手淘占比”
+    clicks = parse_numbers(df[col_map["点击人气"]])
+    index  = parse_numbers(df[col_map["商品指数"]])
+    rate   = parse_numbers(df[col_map["支付转化率"]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_visitors = np.where(np.isnan(rate) | (rate == 0), np.nan, index / (rate / 100))
+        taobao_ratio   = np.where(np.isnan(total_visitors) | (total_visitors == 0), np.nan,
+                                  clicks / total_visitors)
+
+    idx_total  = col_map["总访客数"] + 1
+    idx_ratio  = col_map["手淘占比"] + 1
+    idx_hot    = col_map.get("搜索热度")
+    idx_soar   = col_map.get("飙升热度（%）")
+    ratio_col  = df[col_map["手淘占比"]].to_numpy()
+    soar_col   = df[idx_soar].to_numpy() if idx_soar is not None else None
+    hot_col    = df[idx_hot].to_numpy() if idx_hot is not None else None
+
+    for i in np.flatnonzero(keep):
+        r = int(i) + 2
+        tv, tr = total_visitors[i], taobao_ratio[i]
+        tv = round(float(tv), 2) if not np.isnan(tv) and tv else None
+        tr = round(100 * float(tr), 4) if not np.isnan(tr) and tr else None
+        ws.cell(row=r, column=idx_total, value=tv)
+        ratio_col[i] = tr
+        # 去除“搜索热度”列中的百分号
+        if hot_col is not None:
+            val_h = hot_col[i]
+            if isinstance(val_h, str) and val_h.endswith("%"):
+                ws.cell(row=r, column=idx_hot + 1, value=val_h.replace("%", "").strip())
+
+    # 给“手淘占比”和“飙升热度（%）”所有非空值统一添加百分号；只写回有变化的单元格
+    for i in range(len(df)):
+        r = i + 2
+        if keep[i] or with_percent(ratio_col[i]) != ratio_col[i]:
+            ws.cell(row=r, column=idx_ratio, value=with_percent(ratio_col[i]))
+        if soar_col is not None and with_percent(soar_col[i]) != soar_col[i]:
+            ws.cell(row=r, column=idx_soar + 1, value=with_percent(soar_col[i]))
+
+    wb.save(path)
+    print(f"已处理：{path}")
+
+def _process_one(full_path):
+    """子进程入口：返回 None 表示成功，否则返回错误信息"""
+    start = time.perf_counter()
+    try:
+        process_excel_fast(full_path)
+        return None
+    except (zipfile.BadZipFile, KeyError, Exception) as e:
+        return str(e)
+    finally:
+        telemetry.event("final_process", time.perf_counter() - start)
+
+def bad_record(full_path, err, bad_records):
+    """记录并跳过损坏文件"""
+    rel_dir = os.path.relpath(os.path.dirname(full_path), INPUT_DIR)
+    fname = os.path.basename(full_path)
+    bad_records.append((rel_dir, fname))
+    print(f"[损坏跳过] {os.path.join(rel_dir, fname)}：{err}")
+
+def write_bad_records(bad_records):
+    if bad_records:
+        with open(BAD_RECORD_CSV, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(["二级目录", "文件名称"])
+            writer.writerows(bad_records)
+        print(f"已生成坏文件记录：{BAD_RECORD_CSV}")
+
+def follow(workers=STREAM_PROCESSES):
+    """
+    流式模式：从 manifest 的 xlsx 队列领取 pipeline 刚写好的 Excel 并行处理，
+    xlsx 队列关闭且全部处理完后返回。
+    """
+    manifest.requeue("xlsx")
+    bad_records = []
+    running = {}  # future -> 路径
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # 最多领取两倍进程数的文件，其余留在队列里
+            while len(running) < workers * 2:
+                path = manifest.claim("xlsx")
+                if path is None:
+                    break
+                running[pool.submit(_process_one, path)] = path
+            if running:
+                finished, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+            else:
+                if manifest.drained("xlsx"):
+                    break
+                finished = ()
+                time.sleep(1)
+            for fut in finished:
+                path = running.pop(fut)
+                err = fut.result()
+                if err is None:
+                    manifest.done("xlsx", path)
+                else:
+                    manifest.fail("xlsx", path, err)
+                    bad_record(path, err, bad_records)
+    write_bad_records(bad_records)
+
 def main():
+    if "--follow" in sys.argv:
+        follow()
+        return
+
     bad_records = []  # list of (二级目录, 文件名)
 
+    paths = []
     for root, _, files in os.walk(INPUT_DIR):
         for fname in files:
             if not fname.lower().endswith(".xlsx") or fname.startswith("~$"):
                 continue
-            full_path = os.path.join(root, fname)
-            try:
-                process_excel(full_path)
-            except (zipfile.BadZipFile, KeyError, Exception) as e:
-                # 记录并跳过
-                rel_dir = os.path.relpath(root, INPUT_DIR)
-                bad_records.append((rel_dir, fname))
-                print(f"[损坏跳过] {os.path.join(rel_dir, fname)}：{e}")
+            paths.append(os.path.join(root, fname))
+
+    with ProcessPoolExecutor(max_workers=PROCESSES) as pool:
+        for full_path, err in zip(paths, pool.map(_process_one, paths)):
+            if err is None:
                 continue
+            bad_record(full_path, err, bad_records)
 
     # 写出坏文件记录
-    if bad_records:
-        with open(BAD_RECORD_CSV, "w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.writer(f)
-            writer.writerow(["二级目录", "文件名称"])
-            writer.writerows(bad_records)
-        print(f"已生成坏文件记录：{BAD_RECORD_CSV}")
+    write_bad_records(bad_records)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+image_cache.py：图片磁盘缓存，按图片链接 + 内容哈希存放已经转换好的图片字节
+         （多进程共享 + SQLite 索引 + 按总大小 LRU 淘汰 + 命中/未命中计数）
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import db
+from config import image_cache_mb
+
+# -------- 配置 --------
+CACHE_DIR   = "image_cache"
+INDEX_DB    = os.path.join(CACHE_DIR, "index.db")
+MAX_BYTES   = int(image_cache_mb * 1024 * 1024)  # 缓存总大小上限，0 表示关闭缓存
+EVICT_STEP  = max(MAX_BYTES // 20, 1)            # 本进程每新写入这么多字节检查一次总大小，超过上限就淘汰
+# ----------------------
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+
+_written = 0  # 本进程上次检查总大小之后新写入的字节数
+_written_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    # WAL 模式下各进程可以同时读，写入按库锁串行
+    return db.connect(INDEX_DB, SCHEMA)
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(CACHE_DIR, digest[:2], digest)
+
+
+def _bump(conn, name: str, n: int = 1):
+    conn.execute("INSERT INTO stats(name, value) VALUES(?, ?) "
+                 "ON CONFLICT(name) DO UPDATE SET value = value + ?", (name, n, n))
+
+
+def lookup(image_url: str, count=True):
+    """命中则返回缓存文件路径并刷新访问时间，否则返回 None；count=False 时不计入命中统计"""
+    if not MAX_BYTES or not image_url:
+        return None
+    try:
+        conn = _connect()
+        row = conn.execute("SELECT digest FROM urls WHERE url = ?", (image_url,)).fetchone()
+        if not row or not os.path.exists(_blob_path(row[0])):
+            if count:
+                _bump(conn, "miss")
+            return None
+        conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), row[0]))
+        if count:
+            _bump(conn, "hit")
+        return _blob_path(row[0])
+    except sqlite3.Error as e:
+        print(f"[警告] 读取图片缓存失败：{image_url}，错误：{e}")
+        return None
+
+
+def put(image_url: str, data: bytes, count=True):
+    """
+    写入缓存并返回缓存文件路径：内容相同的图片只存一份，文件先写临时文件再原子替换。
+    count=False 时不计入下载次数（例如同一次下载的原图和缩略图只算一次）。
+    本进程每新写入 EVICT_STEP 字节执行一次容量淘汰，长时间运行时缓存也不会超过上限太多
+    """
+    global _written
+    if not MAX_BYTES or not image_url or not data:
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    try:
+        if not os.path.exists(path):
+            with _written_lock:
+                _written += len(data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO blobs(digest, size, last_used) VALUES(?, ?, ?)",
+                         (digest, len(data), time.time()))
+            conn.execute("INSERT OR REPLACE INTO urls(url, digest) VALUES(?, ?)",
+                         (image_url, digest))
+            if count:
+                _bump(conn, "download")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    except (OSError, sqlite3.Error) as e:
+        print(f"[警告] 写入图片缓存失败：{image_url}，错误：{e}")
+        return None
+    _evict_if_due()
+    return path
+
+
+def _evict_if_due():
+    """本进程新写入满 EVICT_STEP 字节后淘汰一次；淘汰失败只打印警告，已写入的缓存照常可用"""
+    global _written
+    with _written_lock:
+        if _written < EVICT_STEP:
+            return
+        _written = 0
+    try:
+        evict()
+    except (OSError, sqlite3.Error) as e:
+        print(f"[警告] 图片缓存淘汰失败，错误：{e}")
+
+
+def evict(max_bytes: int = MAX_BYTES):
+    """按最近使用时间淘汰，直到缓存总大小不超过 max_bytes；返回淘汰的文件数，并计入 evict 统计"""
+    if not os.path.exists(INDEX_DB):
+        return 0
+    conn = _connect()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    removed = 0
+    if total <= max_bytes:
+        return removed
+    for digest, size in conn.execute(
+            "SELECT digest, size FROM blobs ORDER BY last_used").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+        conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        conn.execute("COMMIT")
+        try:
+            os.remove(_blob_path(digest))
+        except OSError:
+            pass
+        total -= size
+        removed += 1
+    _bump(conn, "evict", removed)
+    return removed
+
+
+def reset_stats():
+    """清零命中/未命中计数，每次运行开始时调用"""
+    if not MAX_BYTES:
+        return
+    _connect().execute("DELETE FROM stats")
+
+
+def stats() -> dict:
+    """返回 {"hit": n, "miss": n, "download": n, "evict": n}，汇总所有进程的计数"""
+    names = ("hit", "miss", "download", "evict")
+    if not MAX_BYTES or not os.path.exists(INDEX_DB):
+        return dict.fromkeys(names, 0)
+    rows = dict(_connect().execute("SELECT name, value FROM stats").fetchall())
+    return {k: rows.get(k, 0) for k in names}
+
+
+def report():
+    """运行结束时再执行一次容量淘汰，并打印命中率和本次运行（含运行中途）淘汰的文件数"""
+    if not MAX_BYTES:
+        return
+    evict()
+    s = stats()
+    total = s["hit"] + s["miss"]
+    rate = s["hit"] / total * 100 if total else 0
+    print(f"[图片缓存] 命中 {s['hit']} 次，未命中 {s['miss']} 次，命中率 {rate:.1f}%，"
+          f"本次下载 {s['download']} 张，淘汰 {s['evict']} 个文件")
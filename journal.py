@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+journal.py：解析进度日志，每爬完一行商品指标立即追加记录，进程被杀后重跑可直接回放
+         （SQLite WAL 多进程共享 + 按 CSV 和时间范围分组 + 只追加不修改）
+同一 CSV 在不同 time_range（"7"、"30"、"7+30"）下的记录互不复用，改了时间范围重跑不会把旧窗口的数值当成新窗口的
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+import db
+# -------- 配置 --------
+JOURNAL_DB = os.path.join("output", "journal.db")
+# ----------------------
+
+SCHEMA = (
+    # 旧版日志不区分时间范围，无法判断记录的是哪个窗口的数值，丢弃后重爬
+    "DROP TABLE IF EXISTS rows",
+    "CREATE TABLE IF NOT EXISTS entries ("
+    "csv TEXT NOT NULL, time_range TEXT NOT NULL, url TEXT NOT NULL, data TEXT NOT NULL, "
+    "done_at REAL NOT NULL, PRIMARY KEY (csv, time_range, url))",
+)
+
+
+def _connect() -> sqlite3.Connection:
+    return db.connect(JOURNAL_DB, SCHEMA)
+
+
+def load(csv_path: str, time_range: str) -> dict:
+    """回放某个 CSV 在 time_range 下已完成的行，返回 {商品链接: 指标字典}"""
+    rows = _connect().execute("SELECT url, data FROM entries WHERE csv = ? AND time_range = ?",
+                              (csv_path, time_range))
+    return {url: json.loads(data) for url, data in rows}
+
+
+def record_many(csv_paths, url: str, data: dict, time_range: str):
+    """记录一行爬取结果：同一链接出现在多个 CSV 中时，一次事务扇出写入所有 CSV 的日志，提交即落盘"""
+    payload = json.dumps(data, ensure_ascii=False)
+    now = time.time()
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR IGNORE INTO entries(csv, time_range, url, data, done_at) VALUES(?, ?, ?, ?, ?)",
+                         [(c, time_range, url, payload, now) for c in csv_paths])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def clear(csv_path: str):
+    """Excel 成功保存后删除该 CSV 的日志（所有时间范围）"""
+    _connect().execute("DELETE FROM entries WHERE csv = ?", (csv_path,))
@@ -1,6 +1,9 @@
+import atexit
+import importlib.util
 import subprocess
 import sys
-from config import operation_steps
+import time
+from config import operation_steps, single_pass, streaming
 #######################
 ###  第一步：配置环境  ###
 ######################
@@ -9,43 +12,92 @@ from config import operation_steps
 required_packages = [
     'selenium',
     'openpyxl',
+    'xlsxwriter',
     'requests',
     'pandas',
+    'pyarrow',         # 列式数据集
     'beautifulsoup4',  # bs4 实际包名
-    'pillow'           # PIL 实际包名
+    'lxml',            # 指标页解析
+    'pillow',          # PIL 实际包名
+    'psutil'           # 浏览器内存监控
 ]
 
-# 使用清华源安装缺失包
+# pip 包名与导入名不同的包
+IMPORT_NAMES = {'beautifulsoup4': 'bs4', 'pillow': 'PIL'}
+
+# 使用清华源安装缺失包；只查找模块是否存在，不真正导入 selenium、pandas 等大包
 def install_if_missing(package_list):
     for pkg in package_list:
-        try:
-            __import__(pkg if pkg != 'beautifulsoup4' else 'bs4')
-        except ImportError:
+        if importlib.util.find_spec(IMPORT_NAMES.get(pkg, pkg)) is None:
             subprocess.check_call([
                 sys.executable, '-m', 'pip', 'install', pkg,
                 '-i', 'https://pypi.tuna.tsinghua.edu.cn/simple'
             ])
 install_if_missing(required_packages)
 
-if operation_steps[0] == 1:
+import telemetry
+# 本次运行编号写入环境变量，三个模块及其子进程的事件归到同一次运行；退出时（包括失败退出）打印各阶段汇总
+telemetry.run_id()
+atexit.register(telemetry.summary)
+
+if streaming == 1:
+    # 流式模式：三个模块同时启动，通过 manifest 队列交接文件（csv 队列：爬取链接 -> 解析链接，xlsx 队列：解析链接 -> 最终处理）
+    import manifest
+    manifest.reopen("csv")
+    manifest.reopen("xlsx")
+    stages = [
+        (operation_steps[0] == 1, 'crawler.py', [], "csv"),
+        (operation_steps[1] == 1, 'pipeline.py', ['--follow'], "xlsx"),
+        (operation_steps[2] == 1 and single_pass != 1, 'final_process.py', ['--follow'], None),
+    ]
+    running = []
+    for enabled, script, args, produces in stages:
+        if enabled:
+            print(f"\n>>> 流式启动模块: {script}")
+            running.append((script, produces, time.perf_counter(),
+                            subprocess.Popen([sys.executable, script] + args)))
+        elif produces:
+            # 该步骤不运行，下游只处理队列里已有的文件
+            manifest.close(produces)
+    failed = 0
+    # 按上下游顺序等待；上游退出（包括失败）后关闭它的输出队列，下游处理完剩余文件自行退出
+    for script, produces, start, proc in running:
+        code = proc.wait()
+        telemetry.event(f"module.{script[:-3]}", time.perf_counter() - start)
+        if produces:
+            manifest.close(produces)
+        if code != 0:
+            print(f"模块 {script} 执行失败，退出码 {code}")
+            failed = failed or code
+    manifest.summary()
+    if failed:
+        sys.exit(failed)
+
+if streaming != 1 and operation_steps[0] == 1:
     # 运行 'crawler.py' 模块
     print("\n>>> 正在运行模块: crawler.py")
-    result_crawler = subprocess.run([sys.executable, 'crawler.py'])
+    with telemetry.timer("module.crawler"):
+        result_crawler = subprocess.run([sys.executable, 'crawler.py'])
     if result_crawler.returncode != 0:
         print(f"模块 crawler.py 执行失败，退出码 {result_crawler.returncode}")
         sys.exit(result_crawler.returncode)
 
-if operation_steps[1] == 1:
+if streaming != 1 and operation_steps[1] == 1:
     # 运行 'pipeline.py' 模块
     print("\n>>> 正在运行模块: pipeline.py")
-    result_pipeline = subprocess.run([sys.executable, 'pipeline.py'])
+    with telemetry.timer("module.pipeline"):
+        result_pipeline = subprocess.run([sys.executable, 'pipeline.py'])
     if result_pipeline.returncode != 0:
         print(f"模块 pipeline.py 执行失败，退出码 {result_pipeline.returncode}")
         sys.exit(result_pipeline.returncode)
-if operation_steps[2] == 1:
+if operation_steps[2] == 1 and single_pass == 1:
+    # 单遍模式下 pipeline 已完成最终处理，final_process.py 只用于修复旧的输出文件
+    print("\n>>> 单遍模式已在解析链接时完成最终处理，跳过 final_process.py")
+elif streaming != 1 and operation_steps[2] == 1:
     # 运行 'final_process.py' 模块
     print("\n>>> 正在运行模块: final_process.py")
-    result_final_process = subprocess.run([sys.executable, 'final_process.py'])
+    with telemetry.timer("module.final_process"):
+        result_final_process = subprocess.run([sys.executable, 'final_process.py'])
     if result_final_process.returncode != 0:
         print(f"模块 final_process.py 执行失败，退出码 {result_final_process.returncode}")
         sys.exit(result_final_process.returncode)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+manifest.py：流式模式下各步骤之间的持久化任务队列
+         （SQLite WAL 多进程共享 + 上游发布文件、下游领取处理 + 上游结束后关闭该队列 + 中断后重领未完成的文件）
+队列：csv   —— crawler 每写完一个叶子 CSV 发布一次，pipeline 领取
+      xlsx  —— pipeline 每生成一个 Excel 发布一次，final_process 领取（单遍模式下不用）
+用法：python manifest.py  打印各队列的状态
+"""
+
+import os
+import time
+import sqlite3
+
+import db
+import telemetry
+
+# -------- 配置 --------
+MANIFEST_DB = "manifest.db"
+# ----------------------
+
+PENDING, CLAIMED, DONE, FAILED = "pending", "claimed", "done", "failed"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS items ("
+    "queue TEXT NOT NULL, path TEXT NOT NULL, state TEXT NOT NULL, "
+    "owner INTEGER, error TEXT, published_at REAL NOT NULL, updated_at REAL NOT NULL, "
+    "PRIMARY KEY (queue, path))",
+    "CREATE TABLE IF NOT EXISTS closed (queue TEXT PRIMARY KEY, closed_at REAL NOT NULL)",
+)
+
+
+def _connect() -> sqlite3.Connection:
+    return db.connect(MANIFEST_DB, SCHEMA)
+
+
+def publish(queue: str, path: str):
+    """发布一个文件；已发布过的（例如重新生成的 Excel）除非正在处理中，否则重新排队"""
+    now = time.time()
+    _connect().execute(
+        "INSERT INTO items(queue, path, state, published_at, updated_at) VALUES(?, ?, ?, ?, ?) "
+        "ON CONFLICT(queue, path) DO UPDATE SET state = excluded.state, error = NULL, "
+        "published_at = excluded.published_at, updated_at = excluded.updated_at "
+        "WHERE items.state != ?",
+        (queue, path, PENDING, now, now, CLAIMED))
+
+
+def claim(queue: str):
+    """按发布顺序领取一个待处理文件，没有则返回 None；领取到的文件记为本进程处理中"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT path, published_at FROM items WHERE queue = ? AND state = ? "
+                           "ORDER BY published_at LIMIT 1", (queue, PENDING)).fetchone()
+        if row:
+            conn.execute("UPDATE items SET state = ?, owner = ?, updated_at = ? WHERE queue = ? AND path = ?",
+                         (CLAIMED, os.getpid(), time.time(), queue, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if row is None:
+        return None
+    # 从发布到被领取的等待时间：越小说明下游跟得越紧
+    telemetry.event(f"queue_wait.{queue}", time.time() - row[1])
+    return row[0]
+
+
+def _set_state(queue: str, path: str, state: str, error=None):
+    _connect().execute("UPDATE items SET state = ?, error = ?, updated_at = ? WHERE queue = ? AND path = ?",
+                       (state, error, time.time(), queue, path))
+
+
+def done(queue: str, path: str):
+    _set_state(queue, path, DONE)
+
+
+def fail(queue: str, path: str, error=""):
+    _set_state(queue, path, FAILED, str(error)[:500])
+
+
+def requeue(queue: str):
+    """消费端启动时调用：上次中断时处理到一半的文件重新排队"""
+    _connect().execute("UPDATE items SET state = ?, owner = NULL, updated_at = ? WHERE queue = ? AND state = ?",
+                       (PENDING, time.time(), queue, CLAIMED))
+
+
+def close(queue: str):
+    """上游结束（成功或失败）时调用：之后不会再有新文件，下游处理完剩余文件即可退出"""
+    _connect().execute("INSERT OR REPLACE INTO closed(queue, closed_at) VALUES(?, ?)", (queue, time.time()))
+
+
+def reopen(queue: str):
+    """新一次流式运行开始时调用"""
+    _connect().execute("DELETE FROM closed WHERE queue = ?", (queue,))
+
+
+def drained(queue: str) -> bool:
+    """队列已关闭，且没有待处理或处理中的文件"""
+    conn = _connect()
+    if not conn.execute("SELECT 1 FROM closed WHERE queue = ?", (queue,)).fetchone():
+        return False
+    return not conn.execute("SELECT 1 FROM items WHERE queue = ? AND state IN (?, ?) LIMIT 1",
+                            (queue, PENDING, CLAIMED)).fetchone()
+
+
+def summary():
+    """打印各队列各状态的文件数"""
+    conn = _connect()
+    closed = {q for (q,) in conn.execute("SELECT queue FROM closed")}
+    for queue, state, n in conn.execute("SELECT queue, state, COUNT(*) FROM items "
+                                        "GROUP BY queue, state ORDER BY queue, state"):
+        print(f"[队列] {queue}{'（已关闭）' if queue in closed else ''} {state}：{n} 个")
+
+
+if __name__ == '__main__':
+    summary()
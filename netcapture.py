@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+netcapture.py：从 Chrome 网络日志中读取商品页的数据接口响应，直接得到指标，不等页面渲染
+         （performance 日志 + Network.getResponseBody + JSON/JSONP 解包 + 按卡片标题前缀识别指标）
+指标卡片由页面加载后请求的 JSON 填充；任何 JSON 里形如 {"title": "搜索人气", "value": "152,384"} 的对象
+（标题字段名不限，数值取 VALUE_FIELDS 中第一个存在的字段）都会被识别，不依赖具体接口地址
+"""
+
+import re
+import json
+import time
+
+import telemetry
+
+# -------- 配置 --------
+URL_HINTS    = ("mtop", "jsonp", "callback=")  # 响应类型不是 JSON 时，URL 含这些片段也尝试解析（JSONP）
+URL_FILTER   = ""      # 非空时只看 URL 含该片段的响应（确定了数据接口后可填上，少取无关响应体）
+VALUE_FIELDS = ("displayValue", "showValue", "valueStr", "value", "num", "number", "val")
+POLL_INTERVAL = 0.05   # 轮询网络日志的间隔（秒）
+# ----------------------
+
+JSONP = re.compile(r"^\s*[\w.$]+\s*\((.*)\)\s*;?\s*$", re.S)
+
+
+def enable(opts):
+    """在 ChromeOptions 上打开网络日志（driver.get_log('performance')）"""
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    opts.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return opts
+
+
+def clear(driver):
+    """丢弃已缓存的日志：之后读到的都是 clear 之后发生的请求"""
+    driver.get_log("performance")
+
+
+def _candidate(response) -> bool:
+    url, mime = response.get("url", ""), response.get("mimeType", "")
+    if URL_FILTER and URL_FILTER not in url:
+        return False
+    return "json" in mime or any(h in url for h in URL_HINTS)
+
+
+def _load(body: str):
+    """JSON 或 JSONP 响应体 -> 对象，无法解析返回 None"""
+    m = JSONP.match(body) if body[:1] not in "{[" else None
+    try:
+        return json.loads(m.group(1) if m else body)
+    except ValueError:
+        return None
+
+
+def _display(value):
+    """与页面显示一致：整数加千分位，其它原样转字符串"""
+    if isinstance(value, (bool, dict, list)) or value is None:
+        return None
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value).strip()
+
+
+def extract(payload, match) -> dict:
+    """在任意嵌套的 JSON 中找指标卡片；match(标题) 返回指标字段或 None"""
+    found = {}
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        for v in node.values():
+            if isinstance(v, (dict, list)):
+                stack.append(v)
+            elif isinstance(v, str):
+                key = match(v.strip())
+                if key is None:
+                    continue
+                val = next((_display(node[f]) for f in VALUE_FIELDS if f in node), None)
+                if val is not None:
+                    found[key] = val
+                break
+    return found
+
+
+def responses(driver, pending: dict):
+    """
+    读一次网络日志，返回已经加载完成的候选响应 [(url, 对象), ...]。
+    pending 记录已收到响应头、尚未加载完成的请求（requestId -> url），跨多次调用保留。
+    """
+    out = []
+    for entry in driver.get_log("performance"):
+        try:
+            msg = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method, params = msg.get("method"), msg.get("params", {})
+        if method == "Network.responseReceived" and _candidate(params.get("response", {})):
+            pending[params["requestId"]] = params["response"]["url"]
+        elif method == "Network.loadingFinished" and params.get("requestId") in pending:
+            url = pending.pop(params["requestId"])
+            try:
+                body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+            except Exception:
+                continue
+            if body.get("base64Encoded"):
+                continue
+            payload = _load(body.get("body", ""))
+            if payload is not None:
+                out.append((url, payload))
+    return out
+
+
+def wait_metrics(driver, keys, match, name: str, timeout: float = 10):
+    """
+    最多等待 timeout 秒，直到数据响应中凑齐 keys 全部指标（可分散在多个响应里，后到的覆盖先到的），
+    返回 {字段: 显示值}；超时返回 None（调用方退回解析页面）。只看上次 clear 之后的请求。
+    """
+    start = time.perf_counter()
+    pending, metrics = {}, {}
+    found = None
+    while found is None and time.perf_counter() - start < timeout:
+        for _, payload in responses(driver, pending):
+            metrics.update(extract(payload, match))
+        if all(k in metrics for k in keys):
+            found = metrics
+        else:
+            time.sleep(POLL_INTERVAL)
+    telemetry.event(f"network.{name}", time.perf_counter() - start, timeout=found is None)
+    return found
@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 """
 pipeline.py：解析数据，读取 CSV，多进程可视模式爬取指标，下载原图并写入 Excel
-         （并行处理每个 CSV + 顺序爬指标+下载原图+跳过已生成文件+图片缩放显示）
+         （全局链接去重 + 常驻浏览器按批次领取任务+后台并发下载图片并生成缩略图+按 CSV 扇出写 Excel+跳过已生成文件+图片缩放显示）
+用法：python pipeline.py            处理 product_link/ 下所有还没有 Excel 的 CSV
+      python pipeline.py --follow   流式模式，边领取爬取链接阶段刚写完的 CSV 边处理，直到上游结束
 """
 
 from PIL import JpegImagePlugin
@@ -12,10 +14,16 @@ import os
 import sys
 import time
 import random
+import hashlib
+import tempfile
 import requests
 import pandas as pd
 from io import BytesIO
-from multiprocessing import Pool
+from queue import Empty
+from multiprocessing import Pool, Process, Queue
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -26,11 +34,28 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from bs4 import BeautifulSoup
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as XLImage
+from lxml import etree, html as lxml_html
+import xlsxwriter
 from PIL import Image as PILImage
 
-from config import candidate_headers,time_range, processing_quantity, is_head
+try:
+    import psutil  # 可选：用于按内存回收浏览器
+except ImportError:
+    psutil = None
+
+import autoscale
+import dataset
+import image_cache
+import journal
+import manifest
+import netcapture
+import telemetry
+import waits
+from final_process import derive_metrics, with_percent
+from config import (candidate_headers, time_range, category, processing_quantity, is_head,
+                    image_concurrency, recycle_pages, recycle_memory_mb, single_pass, dataset_sink,
+                    thumbnail_scale, keep_originals, stream_workers,
+                    network_capture, lean_browser, browser_tabs)
 from requests.exceptions import ReadTimeout
 from selenium.common.exceptions import WebDriverException
 
@@ -38,14 +63,50 @@ from selenium.common.exceptions import WebDriverException
 # -------- 配置 --------
 INPUT_DIR   = "product_link"
 OUTPUT_DIR  = "output"
-PROCESSES   = processing_quantity   # 并行处理 CSV 的进程数
+PROCESSES   = processing_quantity   # 常驻浏览器进程数
+IMAGE_WORKERS = image_concurrency   # 每个进程并发下载图片的线程数
+BATCH_SIZE  = 20                    # 每次从队列领取的链接数
+RECYCLE_PAGES     = recycle_pages       # 浏览器加载多少页后重启
+RECYCLE_MEMORY_MB = recycle_memory_mb   # 浏览器内存超过多少 MB 后重启，0 代表不检查
+SINGLE_PASS = single_pass == 1      # 写 Excel 时直接算派生列、去重、冻结表头
+DATASET_SINK = dataset_sink == 1    # 同时写入 dataset/ 列式数据集
+RUN_DATE = date.today().isoformat() # 数据集分区用的运行日期
+STREAM_CRAWLERS = stream_workers[1] # 流式模式下的常驻浏览器进程数
+STREAM_BUILDERS = stream_workers[2] # 流式模式下写 Excel 的进程数
 
 # 插入到 Excel 中的尺寸（像素）
 IMAGE_SHOW_WIDTH  = 50
 IMAGE_SHOW_HEIGHT = 50
 
+# 缩略图：嵌入前缩到 显示尺寸 × THUMB_SCALE，0 代表嵌入原图
+THUMB_SCALE    = thumbnail_scale
+THUMB_QUALITY  = 85                 # 缩略图 JPEG 质量
+KEEP_ORIGINALS = keep_originals == 1
+
+NETWORK_CAPTURE = network_capture == 1  # 从数据接口响应读取指标，读不到时解析页面
+
+# 精简浏览：商品页只需要指标卡片的文字，图片由 image_file / prefetch_image 另外下载；
+# 脚本、样式表和数据接口照常加载，卡片照常渲染
+LEAN_BROWSER = lean_browser == 1
+
+# 多标签页：每个浏览器同时推进的商品页数，以及每个标签页等页面就绪的上限（秒），超时按当前内容解析
+TABS = max(1, browser_tabs)
+TAB_LOAD_TIMEOUT   = 15
+TAB_SWITCH_TIMEOUT = 5
+
+RESTART_BACKOFF = 5  # 浏览器异常（包括启动失败）后等多少秒再重开
+BLOCKED_URLS = [
+    # 图片、音视频、字体
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.svg*", "*.ico*",
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.flv*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    # 第三方统计与埋点
+    "*mmstat.com*", "*/alilog/*", "*aplus_*.js*", "*arms-retcode*", "*retcode.alicdn.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*hm.baidu.com*", "*cnzz.com*",
+]
+
 # Excel 单元格设置
-IMAGE_COL = "A"
+IMAGE_COL = 0    # 图片列（A 列）
 COL_WIDTH = 10   # 大概对应 10 个字符宽度 ≈ 75px
 ROW_HEIGHT = 40  # 大概 40 磅 ≈ 53px
 # ----------------------
@@ -63,60 +124,152 @@ def init_driver():
     opts.add_argument("--disable-gpu")
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-blink-features=AutomationControlled")
+    if NETWORK_CAPTURE and TABS == 1:
+        # 多标签页模式（crawl_tabs）只解析页面、不读网络日志，开着日志 chromedriver 会一直缓存请求事件
+        netcapture.enable(opts)
+    if LEAN_BROWSER:
+        lean_profile(opts)
+    if TABS > 1:
+        background_tabs(opts)
     service = Service(executable_path=driver_path)
-    return webdriver.Chrome(service=service, options=opts)
+    driver = webdriver.Chrome(service=service, options=opts)
+    if LEAN_BROWSER:
+        block_resources(driver)
+    return driver
 
 
-def crawl_metrics(driver, url, time_range):
-    """单次：加载页面、切换30天、解析指标/商品名/详情链接"""
-    # 1) 加载页面，最多6次重试
-    for attempt in range(1, 7):
-        try:
-            driver.get(url)
-            break
-        except WebDriverException as e:
-            print(f"[警告] 第{attempt}次加载页面失败: {e}")
-            time.sleep(5)
-    else:
-        print(f"[错误] 无法加载页面，跳过：{url}")
-        keys = [
-            "搜索人气","搜索热度","点击人气","点击热度",
-            "点击率","交易指数","支付转化率","商品指数","飙升热度（%）",
-            "商品名称","链接"
-        ]
-        return {k: None for k in keys}
-
-    # 2) 切换近30天（如果需要），最多6次
-    if time_range == '30':
-        for attempt in range(1, 7):
-            try:
-                btn = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, "//button[.//span[contains(text(),'近30天')]]")
-                    )
-                )
-                btn.click()
-                WebDriverWait(driver, 5).until_not(
-                    EC.text_to_be_present_in_element(
-                        (By.CLASS_NAME, "card_content_item_box_number"), "加载中"
-                    )
-                )
-                break
-            except Exception as e:
-                print(f"[警告] 第{attempt}次切换30天失败: {e}")
-                time.sleep(1)
-        time.sleep(1)  # 确保刷新到30天的数据
+def background_tabs(opts):
+    """多标签页模式下后台标签页照常运行定时器和渲染，否则切走后页面会被降速"""
+    opts.add_argument("--disable-background-timer-throttling")
+    opts.add_argument("--disable-renderer-backgrounding")
+    opts.add_argument("--disable-backgrounding-occluded-windows")
+    return opts
+
+
+def lean_profile(opts):
+    """Chrome 偏好：不加载图片、不下载网络字体、不自动播放媒体"""
+    opts.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+        "profile.default_content_setting_values.media_stream": 2,
+    })
+    opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.add_argument("--disable-remote-fonts")
+    opts.add_argument("--autoplay-policy=user-gesture-required")
+    return opts
+
+
+def block_resources(driver):
+    """DevTools 屏蔽列表：偏好管不到的请求（CSS 背景图、预加载的视频、统计脚本和埋点）直接不发出"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except WebDriverException as e:
+        print(f"[警告] 设置屏蔽列表失败，完整加载页面：{e}")
+
+
+_session = None
+
+def get_session() -> requests.Session:
+    """进程内共享的 HTTP 会话，连接池大小与下载线程数一致，复用 alicdn 的长连接"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=IMAGE_WORKERS, pool_maxsize=IMAGE_WORKERS)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
 
-    # 3) 解析页面
-    soup = BeautifulSoup(driver.page_source, "lxml")
 
-    # 指标字段
-    metric_keys = [
-        "搜索人气","搜索热度","点击人气","点击热度",
-        "点击率","交易指数","支付转化率","商品指数","飙升热度（%）"
-    ]
-    metrics = {k: None for k in metric_keys}
+# 指标卡片标题 -> 字段：页面上的标题可能带后缀（单位、提示图标文字），按前缀匹配
+METRIC_KEYS = [
+    "搜索人气","搜索热度","点击人气","点击热度",
+    "点击率","交易指数","支付转化率","商品指数","飙升热度（%）"
+]
+METRIC_PREFIXES = {k: k for k in METRIC_KEYS}
+PREFIX_LENGTHS = sorted({len(k) for k in METRIC_KEYS}, reverse=True)  # 长前缀优先
+DETAIL_TEXT = "查看淘宝商品详情"
+
+
+def match_metric(title: str):
+    """标题对应的指标字段，查前缀表，不匹配返回 None"""
+    for n in PREFIX_LENGTHS:
+        key = METRIC_PREFIXES.get(title[:n])
+        if key is not None:
+            return key
+    return None
+
 
+# 一次 execute_script 只取回指标卡片、商品名称和详情链接，不传整页源码；
+# 文字按 BeautifulSoup get_text(strip=True) 的规则拼接（各文本节点去首尾空白后直接相连）
+METRICS_JS = """
+const text = el => {
+    if (!el) return null;
+    const parts = [];
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const t = walker.currentNode.nodeValue.trim();
+        if (t) parts.push(t);
+    }
+    return parts.join('');
+};
+const cards = [];
+document.querySelectorAll('.card_content_item_box').forEach(box => {
+    const t = box.querySelector('.card_content_item_box_title');
+    const v = box.querySelector('.card_content_item_box_number');
+    if (t && v) cards.push([text(t), text(v)]);
+});
+const link = Array.from(document.querySelectorAll('a')).find(a => (a.textContent || '').includes(arguments[0]));
+return {cards: cards,
+        name: text(document.querySelector('div.header_right_title')),
+        link: link ? link.getAttribute('href') : null};
+"""
+
+# 整页源码的解析（脚本不可用时的后备，以及离线基准）：预编译的 XPath，只访问需要的节点
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+XP_CARDS  = etree.XPath(f"//*[{_has_class('card_content_item_box')}]")
+XP_TITLE  = etree.XPath(f".//*[{_has_class('card_content_item_box_title')}]")
+XP_NUMBER = etree.XPath(f".//*[{_has_class('card_content_item_box_number')}]")
+XP_NAME   = etree.XPath(f"//div[{_has_class('header_right_title')}]")
+XP_LINK   = etree.XPath("//a[contains(., $text)]")
+
+
+def _text(el):
+    return "".join(t.strip() for t in el.itertext())
+
+
+def metrics_from(cards, name, link):
+    """卡片 [(标题, 数值), ...] + 商品名称 + 详情链接 -> 指标字典"""
+    metrics = {k: None for k in METRIC_KEYS}
+    for title, val in cards:
+        key = match_metric(title)
+        if key is not None:
+            metrics[key] = val
+    metrics["商品名称"] = name
+    metrics["链接"] = link
+    return metrics
+
+
+def parse_metrics_html(page_html: str) -> dict:
+    """用 lxml 解析整页源码"""
+    root = lxml_html.fromstring(page_html)
+    cards = []
+    for box in XP_CARDS(root):
+        t, v = XP_TITLE(box), XP_NUMBER(box)
+        if t and v:
+            cards.append((_text(t[0]), _text(v[0])))
+    name = XP_NAME(root)
+    link = XP_LINK(root, text=DETAIL_TEXT)
+    return metrics_from(cards, _text(name[0]) if name else None,
+                        link[0].get("href") if link else None)
+
+
+def parse_metrics_soup(page_html: str) -> dict:
+    """原来的整页 BeautifulSoup 解析，仅保留作基准对照"""
+    soup = BeautifulSoup(page_html, "lxml")
+    metrics = {k: None for k in METRIC_KEYS}
     for box in soup.select(".card_content_item_box"):
         t = box.select_one(".card_content_item_box_title")
         v = box.select_one(".card_content_item_box_number")
@@ -124,22 +277,166 @@ def crawl_metrics(driver, url, time_range):
             continue
         title = t.get_text(strip=True)
         val   = v.get_text(strip=True)
-        for k in metric_keys:
+        for k in METRIC_KEYS:
             if title.startswith(k):
                 metrics[k] = val
                 break
-
-    # 商品名称
     name_tag = soup.select_one("div.header_right_title")
     metrics["商品名称"] = name_tag.get_text(strip=True) if name_tag else None
-
-    # 查看淘宝详情链接
-    a = soup.find('a', string=lambda s: s and '查看淘宝商品详情' in s)
+    a = soup.find('a', string=lambda s: s and DETAIL_TEXT in s)
     metrics["链接"] = a['href'] if a and a.has_attr('href') else None
+    return metrics
+
+
+def read_metrics(driver) -> dict:
+    """当前指标页的指标/商品名/详情链接，一次脚本调用取回，失败时解析整页源码"""
+    try:
+        found = driver.execute_script(METRICS_JS, DETAIL_TEXT)
+        if found is not None:
+            return metrics_from(found["cards"], found["name"], found["link"])
+    except WebDriverException:
+        pass
+    return parse_metrics_html(driver.page_source)
+
+
+RANGE_30_XPATH = "//button[.//span[contains(text(),'近30天')]]"
+SAME_VALUE_TIMEOUTS = 2  # 切换近30天后连续几次等不到任何变化、卡片却已加载完，就按两个窗口数值相同记录
+
+
+# ———— 时间窗口 ————
+# time_range 为 "7"、"30"，或 "7+30"（一次页面加载同时取两个窗口）。
+# 多窗口时一条记录里各窗口的指标以 "字段@窗口" 存放（如 "搜索人气@30"），商品名称、链接只存一份
+
+def windows(tr=None) -> list:
+    return (tr or time_range).split("+")
+
+
+def merge_windows(per_window: dict) -> dict:
+    """{窗口: 指标字典} -> 一条记录；只有一个窗口时就是该窗口的指标字典"""
+    if len(per_window) == 1:
+        return next(iter(per_window.values()))
+    first = next(iter(per_window.values()))
+    data = {"商品名称": first.get("商品名称"), "链接": first.get("链接")}
+    for w, metrics in per_window.items():
+        for k in METRIC_KEYS:
+            data[f"{k}@{w}"] = metrics.get(k)
+    return data
+
+
+def window_view(data: dict, window: str) -> dict:
+    """一条记录中某个窗口的指标，字段名与单窗口记录相同；单窗口记录原样返回"""
+    if f"{METRIC_KEYS[0]}@{window}" not in data:
+        return data
+    view = {k: data.get(f"{k}@{window}") for k in METRIC_KEYS}
+    view["商品名称"], view["链接"] = data.get("商品名称"), data.get("链接")
+    return view
+
+
+def click_30_days(driver):
+    """点击 近30天 按钮，返回等待卡片刷新的条件（waits.metrics_switched）"""
+    btn = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, RANGE_30_XPATH)))
+    before = waits.card_values(driver)
+    waits.mark_cards(driver)
+    btn.click()
+    return waits.metrics_switched(before)
 
+
+def crawl_metrics_network(driver, ranges):
+    """
+    网络模式：页面加载后直接从数据接口响应读取指标，不等卡片渲染；需要近30天时点击后等下一份响应。
+    商品名称和详情链接仍取自页面。读不到完整指标返回 None，由 crawl_metrics 退回解析页面
+    """
+    per_window = {}
+    metrics = netcapture.wait_metrics(driver, METRIC_KEYS, match_metric, "指标接口", timeout=10)
+    if metrics is None:
+        return None
+    if "7" in ranges:
+        per_window["7"] = metrics
+    if "30" in ranges:
+        try:
+            netcapture.clear(driver)
+            click_30_days(driver)
+        except Exception as e:
+            print(f"[警告] 网络模式切换30天失败: {e}")
+            return None
+        metrics = netcapture.wait_metrics(driver, METRIC_KEYS, match_metric, "近30天接口", timeout=5)
+        if metrics is None:
+            return None
+        per_window["30"] = metrics
+    waits.wait_for(driver, waits.element_present("div.header_right_title"), "商品名称", timeout=5)
+    page = read_metrics(driver)
+    return merge_windows({w: dict(page, **m) for w, m in per_window.items()})
+
+
+def timed_read(driver) -> dict:
+    parse_start = time.perf_counter()
+    metrics = read_metrics(driver)
+    telemetry.event("parse", time.perf_counter() - parse_start)
     return metrics
 
 
+def crawl_metrics(driver, url, time_range):
+    """单次：加载页面、切换30天、解析指标/商品名/详情链接；time_range 为 "7+30" 时一次加载读两个窗口"""
+    ranges = windows(time_range)
+    # 网络模式下先清空日志，之后读到的都是本页的请求；浏览器没开网络日志时只解析页面
+    network = NETWORK_CAPTURE
+    if network:
+        try:
+            netcapture.clear(driver)
+        except WebDriverException:
+            network = False
+
+    # 1) 加载页面，最多6次重试
+    for attempt in range(1, 7):
+        try:
+            with telemetry.timer("driver_get"):
+                driver.get(url)
+            break
+        except WebDriverException as e:
+            print(f"[警告] 第{attempt}次加载页面失败: {e}")
+            waits.pause("页面加载失败退避", 5)
+    else:
+        print(f"[错误] 无法加载页面，跳过：{url}")
+        return merge_windows({w: {k: None for k in METRIC_KEYS + ["商品名称", "链接"]} for w in ranges})
+
+    if network:
+        data = crawl_metrics_network(driver, ranges)
+        if data is not None:
+            return data
+        telemetry.count("network_fallback")
+
+    # 2) 等待默认（近7天）指标卡片渲染完成
+    waits.wait_for(driver, waits.metrics_loaded(), "指标卡片加载", timeout=10)
+    per_window = {}
+    if "7" in ranges:
+        per_window["7"] = timed_read(driver)
+
+    # 3) 切换近30天（如果需要），最多6次
+    if "30" in ranges:
+        switched, timeouts = False, 0
+        for attempt in range(1, 7):
+            try:
+                # 数值变了、或卡片经历了加载 / 重新渲染，且不再显示“加载中”，才算刷新到30天的数据
+                if waits.wait_for(driver, click_30_days(driver), "切换30天", timeout=5):
+                    switched = True
+                    break
+                timeouts += 1
+                # 点击成功、卡片已加载完，却连续两次看不出任何变化：30天与近7天数值相同
+                if timeouts >= SAME_VALUE_TIMEOUTS and waits.metrics_loaded()(driver):
+                    switched = True
+                    break
+                print(f"[警告] 第{attempt}次切换30天后数值未刷新")
+            except Exception as e:
+                print(f"[警告] 第{attempt}次切换30天失败: {e}")
+            waits.pause("切换30天失败退避", 1)
+        # 始终没有刷新时卡片上还是近7天的数值，30天整个窗口记为失败（只取30天时整页重试）
+        per_window["30"] = timed_read(driver) if switched else \
+            {k: None for k in METRIC_KEYS + ["商品名称", "链接"]}
+
+    # 4) 多窗口时合并成一条记录
+    return merge_windows(per_window)
+
+
 def crawl_metrics_with_retry(driver, url, time_range, retries=3):
     """重试调用 crawl_metrics，直到获得任一有效字段"""
     for i in range(1, retries + 1):
@@ -147,31 +444,184 @@ def crawl_metrics_with_retry(driver, url, time_range, retries=3):
         if any(v is not None for v in data.values()):
             return data
         print(f"[重试{i}] URL={url}")
+        telemetry.count("retry")
     print(f"[失败] 放弃 URL={url}")
+    telemetry.count("page_failed")
     return data
 
 
+# ———— 多标签页流水线 ————
+# 一个浏览器开 TABS 个标签页：每个标签页发起加载后立即切到下一个，轮到它时页面就绪才读取；
+# 比多开浏览器进程省内存。标签页模式只解析页面（网络日志不分标签页，不用网络模式）
+
+NAVIGATE_JS     = "window.__tab_pending = true; window.location.href = arguments[0];"
+NEW_DOCUMENT_JS = "return !window.__tab_pending && document.readyState === 'complete';"
+
+
+class TabSlot:
+    """一个标签页上正在爬的商品页：load 等新页面渲染出指标卡片，switch 等切换近30天后刷新"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.item = None
+        self.attempt = 0
+        self.restart = False  # 出错后等下一轮切回本标签页再重新加载
+
+    def start(self, driver, item, attempt=1):
+        self.item, self.attempt, self.restart = item, attempt, False
+        self.stage, self.since, self.started = "load", time.perf_counter(), time.perf_counter()
+        self.per_window, self.switched, self.clicks, self.timeouts = {}, None, 0, 0
+        driver.execute_script(NAVIGATE_JS, item[0])
+
+    def step(self, driver, ranges):
+        """推进一步；页面还没就绪返回 None，完成时返回指标（与 crawl_metrics 的返回值相同）"""
+        waited = time.perf_counter() - self.since
+        if self.stage == "load":
+            if not driver.execute_script(NEW_DOCUMENT_JS):
+                if waited < TAB_LOAD_TIMEOUT:
+                    return None
+                # 超时仍停在上一个页面，不能读取，按整页失败处理
+                return failed_page(ranges)
+            if not waits.metrics_loaded()(driver) and waited < TAB_LOAD_TIMEOUT:
+                return None
+            if "7" in ranges:
+                self.per_window["7"] = timed_read(driver)
+            if "30" not in ranges:
+                return merge_windows(self.per_window)
+            self.stage = "click"
+        if self.stage == "click":
+            try:
+                self.switched = click_30_days(driver)
+                self.stage, self.since = "switch", time.perf_counter()
+                return None
+            except Exception as e:
+                return self.click_failed(f"切换30天失败: {e}")
+        if self.switched(driver):
+            self.per_window["30"] = timed_read(driver)
+            return merge_windows(self.per_window)
+        if waited < TAB_SWITCH_TIMEOUT:
+            return None
+        self.timeouts += 1
+        # 与 crawl_metrics 一致：连续两次看不出变化但卡片已加载完，按数值相同处理
+        if self.timeouts >= SAME_VALUE_TIMEOUTS and waits.metrics_loaded()(driver):
+            self.per_window["30"] = timed_read(driver)
+            return merge_windows(self.per_window)
+        return self.click_failed("切换30天后数值未刷新")
+
+    def click_failed(self, reason):
+        """
+        切换近30天失败一次：不满6次时下一轮重新点击；否则卡片上仍是近7天的数值，
+        30天整个窗口记为失败（与 crawl_metrics 一致）
+        """
+        self.clicks += 1
+        print(f"[警告] 第{self.clicks}次{reason}")
+        if self.clicks < 6:
+            self.stage = "click"
+            return None
+        self.per_window["30"] = {k: None for k in METRIC_KEYS + ["商品名称", "链接"]}
+        return merge_windows(self.per_window)
+
+
+def failed_page(ranges) -> dict:
+    """整页失败的记录：所有窗口的字段都为 None"""
+    return merge_windows({w: {k: None for k in METRIC_KEYS + ["商品名称", "链接"]} for w in ranges})
+
+
+def session_alive(driver) -> bool:
+    """浏览器会话还在（能列出标签页）；不在时只能重启浏览器"""
+    try:
+        return bool(driver.window_handles)
+    except WebDriverException:
+        return False
+
+
+def open_tabs(driver, count):
+    """浏览器里凑够 count 个标签页，返回它们的句柄"""
+    handles = list(driver.window_handles)
+    while len(handles) < count:
+        driver.switch_to.new_window("tab")
+        handles.append(driver.current_window_handle)
+    return handles[:count]
+
+
+def crawl_tabs(driver, items, time_range, tabs=None, retries=3):
+    """
+    items 为 [(链接, 图片链接, [CSV...]), ...]，按完成顺序产出 (item, 指标)。
+    与 crawl_metrics_with_retry 一样，整页没有数据的重新加载，最多 retries 次。
+    单个标签页上的 WebDriver 异常按该页失败处理（标签页没了就新开一个），会话级异常才抛出，由调用方重启浏览器。
+    """
+    ranges = windows(time_range)
+    todo = list(reversed(items))
+    slots = [TabSlot(h) for h in open_tabs(driver, tabs or TABS)]
+    while todo or any(slot.item for slot in slots):
+        busy = False
+        for slot in slots:
+            if slot.item is None and not todo:
+                continue
+            try:
+                driver.switch_to.window(slot.handle)
+                if slot.item is None:
+                    slot.start(driver, todo.pop())
+                    continue
+                if slot.restart:
+                    slot.start(driver, slot.item, slot.attempt + 1)
+                    continue
+                data = slot.step(driver, ranges)
+            except WebDriverException as e:
+                if not session_alive(driver):
+                    raise
+                print(f"[警告] 标签页异常：{slot.item[0] if slot.item else ''} {e}")
+                if slot.handle not in driver.window_handles:
+                    driver.switch_to.new_window("tab")
+                    slot.handle = driver.current_window_handle
+                if slot.item is None:
+                    continue
+                if slot.attempt < retries:
+                    # 当前窗口不一定是本标签页，下一轮切换成功后再重新加载
+                    print(f"[重试{slot.attempt}] URL={slot.item[0]}")
+                    telemetry.count("retry")
+                    slot.restart = True
+                    continue
+                data = failed_page(ranges)
+            if data is None:
+                busy = True
+                continue
+            if not any(v is not None for v in data.values()) and slot.attempt < retries:
+                print(f"[重试{slot.attempt}] URL={slot.item[0]}")
+                telemetry.count("retry")
+                slot.start(driver, slot.item, slot.attempt + 1)
+                continue
+            if not any(v is not None for v in data.values()):
+                print(f"[失败] 放弃 URL={slot.item[0]}")
+                telemetry.count("page_failed")
+            telemetry.event("page", time.perf_counter() - slot.started, rows=len(slot.item[2]), tabs=len(slots))
+            item, slot.item = slot.item, None
+            yield item, data
+        if busy:
+            time.sleep(waits.POLL_INTERVAL)
+
+
 def convert_webp_to_png(stream: BytesIO) -> BytesIO:
-    img = PILImage.open(stream).convert("RGB")
-    out = BytesIO()
-    img.save(out, format="PNG")
+    with telemetry.timer("image_convert", format="webp"):
+        img = PILImage.open(stream).convert("RGB")
+        out = BytesIO()
+        img.save(out, format="PNG")
     out.seek(0)
     return out
 
 
-def download_image_stream(image_url: str) -> BytesIO:
+def fetch_image_stream(image_url: str) -> BytesIO:
     """
     下载原图（或将 .webp / .mpo 转为 PNG 或 JPEG），不做额外压缩。
     返回 BytesIO 或 None。
     """
-    if not image_url:
-        return None
-
     for _ in range(3):  # 最多重试3次
         try:
             headers = random.choice(candidate_headers)
-            r = requests.get(image_url, headers=headers, timeout=10)
+            start = time.perf_counter()
+            r = get_session().get(image_url, headers=headers, timeout=10)
             r.raise_for_status()
+            telemetry.event("image_download", time.perf_counter() - start, bytes=len(r.content))
             ct = r.headers.get("Content-Type", "").lower()
             stream = BytesIO(r.content)
 
@@ -187,9 +637,10 @@ def download_image_stream(image_url: str) -> BytesIO:
             # 处理 mpo 图像
             if ".mpo" in image_url.lower() or "mpo" in ct:
                 try:
-                    img = PILImage.open(stream).convert("RGB")
-                    out = BytesIO()
-                    img.save(out, format="JPEG")
+                    with telemetry.timer("image_convert", format="mpo"):
+                        img = PILImage.open(stream).convert("RGB")
+                        out = BytesIO()
+                        img.save(out, format="JPEG")
                     out.seek(0)
                     return out
                 except Exception as e:
@@ -200,109 +651,692 @@ def download_image_stream(image_url: str) -> BytesIO:
 
         except ReadTimeout:
             print(f"[重试] 请求超时：{image_url}")
+            telemetry.count("image_retry")
             continue
         except Exception as e:
             print(f"[跳过] 图片下载失败：{image_url}，错误：{e}")
+            telemetry.count("image_failed")
             return None
 
     print(f"[失败] 多次重试后仍无法下载：{image_url}")
     return None
 
 
-def process_csv(input_csv: str, output_xlsx: str):
-    """顺序处理单个 CSV，并写入 Excel"""
-    driver = init_driver()
+def make_thumbnail(data: bytes) -> bytes:
+    """
+    等比缩小到 显示尺寸 × THUMB_SCALE 以内（只缩不放）并重新编码：
+    带透明通道的存 PNG，其余存 JPEG，统一 96 DPI，image_options 按像素直接换算。
+    缩完反而更大的小图原样返回。
+    """
+    with telemetry.timer("thumbnail"), PILImage.open(BytesIO(data)) as img:
+        img.thumbnail((IMAGE_SHOW_WIDTH * THUMB_SCALE, IMAGE_SHOW_HEIGHT * THUMB_SCALE),
+                      PILImage.LANCZOS)
+        out = BytesIO()
+        if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+            img.convert("RGBA").save(out, format="PNG", optimize=True, dpi=(96, 96))
+        else:
+            img.convert("RGB").save(out, format="JPEG", quality=THUMB_QUALITY,
+                                    optimize=True, dpi=(96, 96))
+    thumb = out.getvalue()
+    return thumb if len(thumb) < len(data) else data
+
+
+def cache_key(image_url: str) -> str:
+    """嵌入用图片在缓存中的键：缩略图带上尺寸，与原图（键为图片链接本身）分开存放"""
+    if not THUMB_SCALE:
+        return image_url
+    return f"{image_url}#thumb={IMAGE_SHOW_WIDTH * THUMB_SCALE}x{IMAGE_SHOW_HEIGHT * THUMB_SCALE}"
+
+
+def embed_bytes(image_url: str):
+    """
+    要嵌入 Excel 的图片字节，返回 (字节或 None, 是否发生了下载)。
+    缩略图模式下优先用缓存里留存的原图重新缩小；需要下载时按 KEEP_ORIGINALS 把原图也存入缓存。
+    """
+    data = None
+    if THUMB_SCALE:
+        path = image_cache.lookup(image_url, count=False)
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+    downloaded = data is None
+    if downloaded:
+        stream = fetch_image_stream(image_url)
+        if stream is None:
+            return None, True
+        data = stream.getvalue()
+        if THUMB_SCALE and KEEP_ORIGINALS:
+            image_cache.put(image_url, data, count=False)
+    if THUMB_SCALE:
+        try:
+            data = make_thumbnail(data)
+        except Exception as e:
+            print(f"[警告] 生成缩略图失败，嵌入原图：{image_url}，错误：{e}")
+    return data, downloaded
+
+
+def image_file(image_url: str, tmp_dir: str):
+    """
+    图片在磁盘上的路径（已转换格式，缩略图模式下已缩小）：优先使用缓存文件，
+    缓存关闭或写入失败时落到 tmp_dir，写 Excel 时按路径插入，不在内存中攒图片。
+    """
+    if not image_url:
+        return None
+    key = cache_key(image_url)
+    path = image_cache.lookup(key)
+    if path:
+        return path
+    data, downloaded = embed_bytes(image_url)
+    if data is None:
+        return None
+    path = image_cache.put(key, data, count=downloaded)
+    if path is None:
+        path = os.path.join(tmp_dir, hashlib.sha1(image_url.encode("utf-8")).hexdigest())
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+def prefetch_image(image_url: str):
+    """爬取阶段把图片（缩略图）预取进磁盘缓存，写 Excel 时直接命中（缓存关闭时不做任何事）"""
+    if not image_cache.MAX_BYTES or not image_url:
+        return
+    key = cache_key(image_url)
+    if image_cache.lookup(key, count=False) is None:
+        data, downloaded = embed_bytes(image_url)
+        if data is not None:
+            image_cache.put(key, data, count=downloaded)
+
+
+def image_options(path: str) -> dict:
+    """按 IMAGE_SHOW_WIDTH×IMAGE_SHOW_HEIGHT 显示的缩放参数（xlsxwriter 会按图片 DPI 换算）"""
+    with PILImage.open(path) as img:
+        w, h = img.size
+        dpi_x, dpi_y = img.info.get("dpi", (96, 96))
+    return {
+        "x_scale": IMAGE_SHOW_WIDTH / w * (float(dpi_x) or 96) / 96,
+        "y_scale": IMAGE_SHOW_HEIGHT / h * (float(dpi_y) or 96) / 96,
+    }
+
+
+# 输出表头：新增 “图片链接” 列
+HEADERS = [
+    "图片", "链接", "图片链接", "商品名称",
+    "搜索人气", "搜索热度", "点击人气", "点击热度",
+    "点击率", "交易指数", "支付转化率", "商品指数", "飙升热度（%）"
+]
+# 单遍模式追加的派生列（原先由 final_process 计算）
+DERIVED_HEADERS = ["总访客数", "手淘占比"]
+
+
+def row_values(image_url: str, data: dict) -> list:
+    """除图片外的一行输出值（B 列起）"""
+    vals = [data.get("链接"), image_url, data.get("商品名称")]
+    for key in HEADERS[4:]:
+        val = data.get(key)
+        # 对“搜索热度”和“手淘占比”后面加"%"
+        if key in ("搜索热度", "飙升热度（%）") and val is not None:
+            val = f"{val}%"
+        vals.append(val)
+    return vals
+
+
+def finalize_values(vals: list) -> list:
+    """单遍模式：直接给出 final_process 处理后的值——搜索热度不带百分号，追加总访客数、手淘占比"""
+    col = {name: i for i, name in enumerate(HEADERS[1:])}
+    vals = list(vals)
+    hot = vals[col["搜索热度"]]
+    if isinstance(hot, str) and hot.endswith("%"):
+        vals[col["搜索热度"]] = hot.replace("%", "").strip()
+    total_visitors, taobao_ratio = derive_metrics(vals[col["点击人气"]], vals[col["商品指数"]],
+                                                  vals[col["支付转化率"]])
+    return vals + [total_visitors, with_percent(taobao_ratio)]
+
+
+def read_links(input_csv: str):
+    """读取 CSV 中的 (商品链接, 图片链接)，跳过空链接"""
+    df = pd.read_csv(input_csv)
+    for idx, row in df.iterrows():
+        page_url  = row.get("Link", "").strip()
+        image_url = row.get("Image", "").strip()
+        if page_url:
+            yield idx, page_url, image_url
+
+
+def plan_tasks(tasks):
+    """
+    规划阶段：汇总所有 CSV 的商品链接，同一链接只爬一次。
+    已在任一 CSV 的 journal 中完成的链接直接扇出到其它 CSV，不再打开页面。
+    返回待爬列表 [(链接, 图片链接, [所属 CSV...]), ...]，按首次出现的 CSV 分组。
+    """
+    index = {}   # 链接 -> [图片链接, [CSV...]]
+    total = 0
+    for in_csv, _ in tasks:
+        for _, page_url, image_url in read_links(in_csv):
+            total += 1
+            entry = index.setdefault(page_url, [image_url, []])
+            if in_csv not in entry[1]:
+                entry[1].append(in_csv)
+
+    done = {}    # 链接 -> 已完成的指标
+    journaled = {in_csv: journal.load(in_csv, time_range) for in_csv, _ in tasks}
+    for in_csv, rows in journaled.items():
+        for url, data in rows.items():
+            done.setdefault(url, data)
+
+    groups = {}  # 首个 CSV -> 待爬链接
+    fanned = 0
+    for page_url, (image_url, csvs) in index.items():
+        if page_url in done:
+            missing = [c for c in csvs if page_url not in journaled[c]]
+            if missing:
+                journal.record_many(missing, page_url, done[page_url], time_range)
+                fanned += len(missing)
+            continue
+        groups.setdefault(csvs[0], []).append((page_url, image_url, csvs))
+
+    pending = sum(len(g) for g in groups.values())
+    print(f"[规划] 共 {total} 行，去重后 {len(index)} 个链接，节省 {total - len(index)} 次页面加载；"
+          f"已完成 {len(index) - pending} 个（扇出 {fanned} 行），待爬 {pending} 个")
+    return list(groups.values())
+
+
+def driver_rss_mb(driver) -> float:
+    """chromedriver 及其全部 Chrome 子进程占用的内存（MB），psutil 不可用时返回 0"""
+    if psutil is None:
+        return 0
     try:
-        df = pd.read_csv(input_csv)
-        wb = Workbook()
-        ws = wb.active
-
-        # 新增 “图片链接” 列
-        headers = [
-            "图片", "链接", "图片链接", "商品名称",
-            "搜索人气", "搜索热度", "点击人气", "点击热度",
-            "点击率", "交易指数", "支付转化率", "商品指数", "飙升热度（%）"
-        ]
-        ws.append(headers)
-        # 设置图片列宽和默认行高
-        ws.column_dimensions[IMAGE_COL].width = COL_WIDTH
-
-        row_no = 2
-        for idx, row in df.iterrows():
-            page_url  = row.get("Link", "").strip()
-            image_url = row.get("Image", "").strip()
-            if not page_url:
-                continue
+        proc = psutil.Process(driver.service.process.pid)
+        procs = [proc] + proc.children(recursive=True)
+        return sum(p.memory_info().rss for p in procs) / 1024 / 1024
+    except Exception:
+        return 0
 
-            data = crawl_metrics_with_retry(driver, page_url, time_range)
-            # 检查除前三列外是否都有值
-            if any(data.get(col) is None for col in headers[3:]):
-                print(f"[跳过] 第{idx}行数据不完整，URL={page_url}")
+
+def make_batches(groups):
+    """把各 CSV 的待爬链接切成小批次，大的类目排在前面先领取"""
+    batches = []
+    for group in sorted(groups, key=len, reverse=True):
+        for i in range(0, len(group), BATCH_SIZE):
+            batches.append(group[i:i + BATCH_SIZE])
+    return batches
+
+
+def quit_driver(driver):
+    """关闭浏览器，忽略已经断开的情况；返回 None 便于直接赋值"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    return None
+
+
+def maybe_recycle(driver, pages, worker_id):
+    """加载 RECYCLE_PAGES 页或内存超限后关闭浏览器，返回 (浏览器或 None, 页数)"""
+    rss = driver_rss_mb(driver) if RECYCLE_MEMORY_MB else 0
+    if pages >= RECYCLE_PAGES or rss > RECYCLE_MEMORY_MB > 0:
+        print(f"[回收] 进程{worker_id} 已加载 {pages} 页，内存 {rss:.0f}MB，重启浏览器")
+        telemetry.count("driver_recycle", rss_mb=round(rss))
+        driver.quit()
+        return None, 0
+    return driver, pages
+
+
+def crawl_worker(queue, worker_id, results=None, stop=None, stats=None):
+    """
+    常驻子进程入口：反复从共享队列领取一批链接，结果写入每个包含该链接的 CSV 的 journal。
+    浏览器跨批次复用，加载 RECYCLE_PAGES 页或内存超限后才重启；图片在后台线程池预取进磁盘缓存。
+    TABS > 1 时一个浏览器开多个标签页流水线推进（crawl_tabs），回收检查按批次进行。
+    给定 results 队列时每爬完一个链接回报一次 (链接, 指标)，供流式模式跟踪各 CSV 的进度。
+    由自动伸缩进程池启动时（stop、stats），被要求退役后做完当前批次再退出，并回报每个链接的耗时。
+    """
+    driver, pages = None, 0
+    mark = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as image_pool:
+
+            def finish(page_url, image_url, csvs, data):
+                # 相邻两个链接完成的间隔即本进程的单链接耗时（多标签页时为摊薄后的耗时）
+                nonlocal mark
+                now = time.perf_counter()
+                autoscale.report(stats, now - mark)
+                mark = now
+                # 整页失败的不记录，重跑时再试
+                if any(v is not None for v in data.values()):
+                    journal.record_many(csvs, page_url, data, time_range)
+                    if image_url:
+                        image_pool.submit(prefetch_image, image_url)
+                if results is not None:
+                    results.put((page_url, data))
+
+            while True:
+                batch = autoscale.next_task(queue, stop, stats)
+                if batch is None:
+                    break
+                mark = time.perf_counter()
+                if TABS > 1:
+                    finished = set()
+                    try:
+                        if driver is None:
+                            driver, pages = init_driver(), 0
+                        for (page_url, image_url, csvs), data in crawl_tabs(driver, batch, time_range):
+                            finished.add(page_url)
+                            pages += 1
+                            finish(page_url, image_url, csvs, data)
+                    except Exception as e:
+                        # 浏览器异常时本批未完成的记为失败并重开
+                        print(f"[错误] 进程{worker_id} 多标签页爬取异常，重启浏览器：{e}")
+                        for page_url, image_url, csvs in batch:
+                            if page_url not in finished:
+                                finish(page_url, image_url, csvs, {})
+                        driver = quit_driver(driver)
+                        waits.pause("浏览器重启退避", RESTART_BACKOFF)
+                    if driver is not None:
+                        driver, pages = maybe_recycle(driver, pages, worker_id)
+                    continue
+
+                for page_url, image_url, csvs in batch:
+                    try:
+                        if driver is None:
+                            driver, pages = init_driver(), 0
+                        with telemetry.timer("page", rows=len(csvs)):
+                            data = crawl_metrics_with_retry(driver, page_url, time_range)
+                    except Exception as e:
+                        # 浏览器异常（崩溃、断开、重启失败）时记为失败，退避后重开，不让整个进程退出丢掉手上的批次
+                        print(f"[错误] 进程{worker_id} 爬取异常，重启浏览器：{page_url} {e}")
+                        data = {}
+                        driver = quit_driver(driver)
+                        waits.pause("浏览器重启退避", RESTART_BACKOFF)
+                    pages += 1
+                    finish(page_url, image_url, csvs, data)
+                    if driver is not None:
+                        driver, pages = maybe_recycle(driver, pages, worker_id)
+    finally:
+        waits.report(prefix=f"[进程{worker_id}] ")
+        if driver is not None:
+            driver.quit()
+
+
+def run_crawl(groups, workers=None) -> set:
+    """
+    启动常驻浏览器进程，从共享队列按批次领取任务，全部结束后返回。
+    不指定 workers 且开启 adaptive_workers 时由 autoscale 按资源增减进程数，否则固定 workers（默认 PROCESSES）个。
+    每个链接（包括爬取失败的）都由进程回报一次；返回还有链接没有回报的 CSV 集合
+    （进程崩溃时丢了手上的批次，或进程全部退出时还剩批次），这些 CSV 不能生成 Excel。
+    """
+    batches = make_batches(groups)
+    if not batches:
+        return set()
+    queue, results = Queue(), Queue()
+    for batch in batches:
+        queue.put(batch)
+    reported = set()
+
+    def collect(timeout):
+        # 边等边取回报，子进程不会因结果队列写不进去而无法退出
+        try:
+            while True:
+                page_url, _ = results.get(timeout=timeout)
+                reported.add(page_url)
+                timeout = 0.1
+        except Empty:
+            pass
+
+    if workers is None and autoscale.ENABLED:
+        pool = autoscale.WorkerPool("解析链接", crawl_worker,
+                                    lambda i, stop, stats: (queue, i, results, stop, stats),
+                                    initial=min(PROCESSES, len(batches)),
+                                    hi=min(autoscale.MAX_WORKERS, len(batches))).start()
+        try:
+            while pool.alive():
+                collect(1)
+                pool.tick(len(batches) - pool.taken)
+                if pool.taken >= len(batches):
+                    pool.drain()  # 批次已全部领走：各进程做完手上的批次后退出
+        finally:
+            pool.join()
+    else:
+        procs = [Process(target=crawl_worker, args=(queue, i, results))
+                 for i in range(min(workers or PROCESSES, len(batches)))]
+        for _ in procs:
+            queue.put(None)  # 每个进程一个结束标记
+        for p in procs:
+            p.start()
+        while any(p.is_alive() for p in procs):
+            collect(1)
+        for p in procs:
+            p.join()
+    collect(0.1)
+
+    unfinished, lost = set(), 0
+    for batch in batches:
+        for page_url, _, csvs in batch:
+            if page_url not in reported:
+                lost += 1
+                unfinished.update(csvs)
+    if lost:
+        print(f"[错误] 浏览器进程异常退出，{lost} 个链接没有爬到，涉及 {len(unfinished)} 个 CSV；"
+              f"这些 CSV 本次不生成 Excel，已爬的结果保留在 journal 中，下次运行接着爬")
+    return unfinished
+
+
+def split_board(stem: str):
+    """叶子文件名 -> (叶子名, 榜单)：多榜单模式下文件名带 "_榜单" 后缀，否则榜单为配置中的榜单"""
+    boards = category.split("+")
+    if len(boards) > 1:
+        for board in boards:
+            if stem.endswith(f"_{board}"):
+                return stem[:-len(board) - 1], board
+    return stem, boards[0]
+
+
+def write_dataset(input_csv: str, rows, window: str):
+    """
+    把这个 CSV 写进 Excel 的行同时写入列式数据集（一个 CSV 一个窗口一个分片文件）。
+    分片名由 CSV 路径决定，生成 Excel 前中断、重跑时覆盖同一个分片，不会重复追加
+    """
+    parts = os.path.normpath(os.path.relpath(input_csv, INPUT_DIR)).split(os.sep)
+    first_level = parts[0]
+    leaf, board = split_board(os.path.splitext(parts[-1])[0])
+    second_level = parts[1] if len(parts) > 2 else leaf
+    records = [dataset.to_record(second_level, leaf, image_url, data)
+               for _, image_url, data, _ in rows]
+    try:
+        name = hashlib.md5(os.path.normpath(input_csv).encode("utf-8")).hexdigest()
+        dataset.write_rows(records, first_level, window, board, RUN_DATE, name=name)
+    except Exception as e:
+        print(f"[警告] 写入数据集失败：{input_csv}，错误：{e}")
+
+
+def window_outputs(output_xlsx: str) -> list:
+    """一个 CSV 的全部输出 [(窗口, Excel 路径), ...]；多窗口时文件名带 "_近N天" 后缀"""
+    ranges = windows()
+    if len(ranges) == 1:
+        return [(ranges[0], output_xlsx)]
+    stem, ext = os.path.splitext(output_xlsx)
+    return [(w, f"{stem}_近{w}天{ext}") for w in ranges]
+
+
+def outputs_exist(output_xlsx: str) -> bool:
+    return all(os.path.exists(path) for _, path in window_outputs(output_xlsx))
+
+
+def build_workbook(input_csv: str, output_xlsx: str):
+    """回放一次 journal，每个时间窗口写一个 Excel，全部写完才清除该 CSV 的 journal"""
+    done = journal.load(input_csv, time_range)
+    for window, path in window_outputs(output_xlsx):
+        write_workbook(input_csv, path, done, window)
+    journal.clear(input_csv)
+
+
+def write_workbook(input_csv: str, output_xlsx: str, done: dict, window: str):
+    """
+    按 CSV 原始顺序回放 journal 中 window 窗口的指标，流式写出 Excel（xlsxwriter constant_memory，逐行落盘）。
+    图片按路径插入，大多已在缓存中，未命中的并发下载；先写 .part 文件，完成后再改名。
+    单遍模式下同时完成 final_process 的工作：派生列、去重、冻结表头，文件只写一次。
+    """
+    build_start = time.perf_counter()
+    rows = []
+    seen = set()
+    for idx, page_url, image_url in read_links(input_csv):
+        data = window_view(done.get(page_url) or {}, window)
+        # 检查除前三列外是否都有值
+        if any(data.get(col) is None for col in HEADERS[3:]):
+            print(f"[跳过] 第{idx}行数据不完整，URL={page_url}")
+            continue
+        vals = row_values(image_url, data)
+        if SINGLE_PASS:
+            # 唯一签名：除图片外所有单元格值，重复行只保留第一次出现的
+            sig = tuple(v.strip() if isinstance(v, str) else v for v in vals)
+            if sig in seen:
                 continue
+            seen.add(sig)
+            vals = finalize_values(vals)
+        rows.append((idx, image_url, data, vals))
 
-            # 下载图片流
-            img_stream = download_image_stream(image_url)
-            if img_stream:
+    os.makedirs(os.path.dirname(output_xlsx), exist_ok=True)
+    part = output_xlsx + ".part"
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as image_pool:
+        # 图片先全部排队并发下载，写行时按顺序取结果
+        futures = [image_pool.submit(image_file, image_url, tmp_dir) for _, image_url, _, _ in rows]
+
+        wb = xlsxwriter.Workbook(part, {
+            "constant_memory": True, "tmpdir": tmp_dir,
+            # 与原来一样按纯文本写入链接和数值字符串
+            "strings_to_urls": False, "strings_to_formulas": False,
+        })
+        ws = wb.add_worksheet()
+        ws.write_row(0, 0, HEADERS + DERIVED_HEADERS if SINGLE_PASS else HEADERS)
+        # 设置图片列宽
+        ws.set_column(IMAGE_COL, IMAGE_COL, COL_WIDTH)
+        if SINGLE_PASS:
+            # 冻结第一行
+            ws.freeze_panes(1, 0)
+
+        images, embedded, originals = 0, 0, 0
+        for r, ((idx, image_url, _, vals), fut) in enumerate(zip(rows, futures), start=1):
+            try:
+                img_path = fut.result()
+            except Exception as e:
+                print(f"[警告] 图片下载任务异常 idx={idx}: {e}")
+                img_path = None
+            if img_path:
                 try:
-                    img = XLImage(img_stream)
-                    # 设置在 Excel 中显示大小（像素）
-                    img.width  = IMAGE_SHOW_WIDTH
-                    img.height = IMAGE_SHOW_HEIGHT
-                    # 调整对应行高
-                    ws.row_dimensions[row_no].height = ROW_HEIGHT
-                    ws.add_image(img, f"{IMAGE_COL}{row_no}")
+                    opts = image_options(img_path)
+                    # 有图片的行调整行高（constant_memory 模式下必须在写该行之前设置）
+                    ws.set_row(r, ROW_HEIGHT)
+                    ws.insert_image(r, IMAGE_COL, img_path, opts)
+                    images += 1
+                    embedded += os.path.getsize(img_path)
+                    if THUMB_SCALE and KEEP_ORIGINALS:
+                        original = image_cache.lookup(image_url, count=False)
+                        originals += os.path.getsize(original) if original else 0
                 except Exception as e:
                     print(f"[警告] 插入图片失败 idx={idx}: {e}")
 
-            # 写入 “链接”、“图片链接”、“商品名称”
-            ws.cell(row=row_no, column=2, value=data.get("链接"))
-            ws.cell(row=row_no, column=3, value=image_url)
-            ws.cell(row=row_no, column=4, value=data.get("商品名称"))
+            # 写入 “链接”、“图片链接”、“商品名称” 及其它字段
+            ws.write_row(r, 1, vals)
 
-            # 写入其它字段
-            for i, key in enumerate(headers[4:], start=5):
-                val = data.get(key)
-                # 对“搜索热度”和“手淘占比”后面加"%"
-                if key in ("搜索热度", "飙升热度（%）") and val is not None:
-                    val = f"{val}%"
-                ws.cell(row=row_no, column=i, value=val)
+        # 图片在 close 时才打包进 xlsx，这一步的耗时随嵌入的图片大小增长
+        start = time.perf_counter()
+        wb.close()
+        save_s = time.perf_counter() - start
+    report_images(output_xlsx, part, images, embedded, originals, save_s)
+    telemetry.event("excel_save", save_s, bytes=os.path.getsize(part))
+    if DATASET_SINK:
+        write_dataset(input_csv, rows, window)
+    os.replace(part, output_xlsx)
+    telemetry.event("workbook", time.perf_counter() - build_start, rows=len(rows))
+    print(f"✅ 已生成：{output_xlsx}")
 
-            row_no += 1
 
-        os.makedirs(os.path.dirname(output_xlsx), exist_ok=True)
-        wb.save(output_xlsx)
-        print(f"✅ 已生成：{output_xlsx}")
-    finally:
-        driver.quit()
+def report_images(output_xlsx: str, part: str, images: int, embedded: int, originals: int, save_s: float):
+    """每个工作簿一行：嵌入图片大小、相对原图缩小的比例、保存耗时、文件大小"""
+    mb = 1024 * 1024
+    line = f"[图片] {os.path.basename(output_xlsx)}：{images} 张，嵌入 {embedded / mb:.2f}MB"
+    if originals:
+        line += f"（原图 {originals / mb:.2f}MB，缩小 {(1 - embedded / originals) * 100:.0f}%）"
+    line += f"，保存 {save_s:.2f}s，文件 {os.path.getsize(part) / mb:.2f}MB"
+    print(line)
+
 
+def process_csv(input_csv: str, output_xlsx: str) -> bool:
+    """单独处理一个 CSV：爬取未完成的链接，再写出 Excel；有链接没爬到时不写，返回 False"""
+    if run_crawl(plan_tasks([(input_csv, output_xlsx)]), workers=1):
+        return False
+    build_workbook(input_csv, output_xlsx)
+    return True
 
-def worker(task):
+
+def build_worker(task):
     """子进程入口：task = (in_csv, out_xlsx)"""
     in_csv, out_xlsx = task
-    if os.path.exists(out_xlsx):
-        print(f"[跳过] 已存在：{out_xlsx}")
-    else:
-        process_csv(in_csv, out_xlsx)
+    build_workbook(in_csv, out_xlsx)
 
 
-def main():
+def output_path(in_csv: str) -> str:
+    """CSV 对应的输出 Excel：product_link/a/b/c.csv -> output/a/b/c.xlsx"""
+    rel = os.path.relpath(os.path.dirname(in_csv), INPUT_DIR)
+    return os.path.join(OUTPUT_DIR, rel, os.path.splitext(os.path.basename(in_csv))[0] + ".xlsx")
+
+
+def find_tasks():
+    """所有还没有生成 Excel 的 CSV：[(in_csv, out_xlsx), ...]"""
     tasks = []
     for root, _, files in os.walk(INPUT_DIR):
         for fname in files:
             if not fname.lower().endswith(".csv"):
                 continue
             in_csv = os.path.join(root, fname)
-            rel    = os.path.relpath(root, INPUT_DIR)
-            out_xl = os.path.join(OUTPUT_DIR, rel,
-                                  os.path.splitext(fname)[0] + ".xlsx")
+            out_xl = output_path(in_csv)
+            if outputs_exist(out_xl):
+                print(f"[跳过] 已存在：{out_xl}")
+                continue
             tasks.append((in_csv, out_xl))
+    return tasks
+
+
+def follow(crawl_workers=STREAM_CRAWLERS, build_workers=STREAM_BUILDERS):
+    """
+    流式模式：从 manifest 的 csv 队列领取爬取链接阶段刚写完的 CSV，链接立即排进常驻浏览器的共享队列；
+    某个 CSV 的链接全部爬完就交给写 Excel 的进程池，写好后发布到 xlsx 队列供最终处理。
+    本次运行中已爬过或正在爬的链接不再重复打开页面。csv 队列关闭且全部处理完后返回。
+    """
+    manifest.requeue("csv")
+    if not SINGLE_PASS:
+        manifest.reopen("xlsx")
+    # 以前留下的、还没有 Excel 的 CSV 同样排队
+    for in_csv, _ in find_tasks():
+        manifest.publish("csv", os.path.normpath(in_csv))
+
+    image_cache.reset_stats()
+    todo, results = Queue(), Queue()
+    procs = [Process(target=crawl_worker, args=(todo, i, results)) for i in range(crawl_workers)]
+    for p in procs:
+        p.start()
+
+    known = {}       # 链接 -> 本次运行已爬到的指标
+    inflight = {}    # 链接 -> 等待它的 CSV（第一个由爬取进程写 journal，其余在这里扇出）
+    remaining = {}   # CSV -> 还没爬完的链接
+    builds = {}      # 写 Excel 的 future -> CSV
+
+    try:
+        with ProcessPoolExecutor(max_workers=build_workers) as build_pool:
+
+            def build(in_csv):
+                remaining.pop(in_csv, None)
+                builds[build_pool.submit(build_workbook, in_csv, output_path(in_csv))] = in_csv
+
+            def schedule(in_csv):
+                journaled = journal.load(in_csv, time_range)
+                waiting, batch = set(), []
+                for _, page_url, image_url in read_links(in_csv):
+                    if page_url in journaled:
+                        continue
+                    if page_url in known:
+                        journal.record_many([in_csv], page_url, known[page_url], time_range)
+                        continue
+                    waiting.add(page_url)
+                    if page_url in inflight:
+                        if in_csv not in inflight[page_url]:
+                            inflight[page_url].append(in_csv)
+                    else:
+                        inflight[page_url] = [in_csv]
+                        batch.append((page_url, image_url, [in_csv]))
+                for i in range(0, len(batch), BATCH_SIZE):
+                    todo.put(batch[i:i + BATCH_SIZE])
+                if waiting:
+                    remaining[in_csv] = waiting
+                else:
+                    build(in_csv)
+
+            def on_result(page_url, data):
+                csvs = inflight.pop(page_url, [])
+                if any(v is not None for v in data.values()):
+                    known[page_url] = data
+                    if len(csvs) > 1:
+                        journal.record_many(csvs[1:], page_url, data, time_range)
+                for in_csv in csvs:
+                    left = remaining.get(in_csv)
+                    if left is not None:
+                        left.discard(page_url)
+                        if not left:
+                            build(in_csv)
+
+            while True:
+                # 1) 领取新发布的 CSV
+                while True:
+                    in_csv = manifest.claim("csv")
+                    if in_csv is None:
+                        break
+                    if outputs_exist(output_path(in_csv)):
+                        manifest.done("csv", in_csv)
+                        continue
+                    print(f"[流式] 领取：{in_csv}")
+                    schedule(in_csv)
+
+                # 2) 收集爬取结果（最多等 1 秒，顺便作为轮询间隔）
+                try:
+                    item = results.get(timeout=1)
+                    while True:
+                        on_result(*item)
+                        item = results.get_nowait()
+                except Empty:
+                    pass
+
+                # 3) 写好的 Excel 交给最终处理
+                for fut in [f for f in builds if f.done()]:
+                    in_csv = builds.pop(fut)
+                    try:
+                        fut.result()
+                        manifest.done("csv", in_csv)
+                        if not SINGLE_PASS:
+                            for _, path in window_outputs(output_path(in_csv)):
+                                manifest.publish("xlsx", path)
+                    except Exception as e:
+                        print(f"[错误] 写 Excel 失败：{in_csv} {e}")
+                        manifest.fail("csv", in_csv, e)
+
+                if not remaining and not builds and manifest.drained("csv"):
+                    break
+                if remaining and not any(p.is_alive() for p in procs):
+                    print("[错误] 浏览器进程全部退出，剩余 CSV 下次运行再处理")
+                    for in_csv in remaining:
+                        manifest.fail("csv", in_csv, "浏览器进程全部退出")
+                    break
+    finally:
+        for _ in procs:
+            todo.put(None)  # 每个进程一个结束标记
+        for p in procs:
+            p.join()
+        if not SINGLE_PASS:
+            manifest.close("xlsx")
+    image_cache.report()
+
+
+def main():
+    if "--follow" in sys.argv:
+        follow()
+        return
 
+    tasks = find_tasks()
     if not tasks:
         print("没有找到任何 CSV。")
         return
 
+    image_cache.reset_stats()
+    # 第一步：常驻浏览器按批次爬取，每个链接只爬一次
+    unfinished = run_crawl(plan_tasks(tasks))
+    # 第二步：按 CSV 扇出写 Excel（不需要浏览器）；有链接没爬到的 CSV 不写，留到下次运行
     with Pool(PROCESSES) as pool:
-        pool.map(worker, tasks)
+        pool.map(build_worker, [t for t in tasks if t[0] not in unfinished])
+    image_cache.report()
+    if unfinished:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
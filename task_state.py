@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+task_state.py：爬取链接阶段的任务状态库，替代多进程直接读改写 一级类目.xlsx
+         （SQLite WAL + 一/二/三级粒度的 pending/running/done/failed + 起止时间与耗时）
+         一级类目.xlsx 只在开始时导入、结束时导出
+用法：python task_state.py  打印各级任务状态汇总
+"""
+
+import time
+import sqlite3
+
+from openpyxl import load_workbook
+
+import db
+
+# -------- 配置 --------
+STATE_DB    = "task_state.db"
+OUTPUT_XLSX = "一级类目.xlsx"
+# ----------------------
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    "first TEXT NOT NULL, second TEXT NOT NULL DEFAULT '', "
+    "leaf TEXT NOT NULL DEFAULT '', level INTEGER NOT NULL, "
+    "state TEXT NOT NULL, excel_row INTEGER, "
+    "started_at REAL, finished_at REAL, duration REAL, error TEXT, "
+    "updated_at REAL NOT NULL, PRIMARY KEY (first, second, leaf))",
+)
+
+
+def _connect() -> sqlite3.Connection:
+    return db.connect(STATE_DB, SCHEMA)
+
+
+def _level(second, leaf):
+    return 3 if leaf else (2 if second else 1)
+
+
+def start(first, second="", leaf=""):
+    """标记任务开始；不存在则新建。单条语句自动提交，不持有长时间的锁"""
+    now = time.time()
+    _connect().execute(
+        "INSERT INTO tasks(first, second, leaf, level, state, started_at, updated_at) "
+        "VALUES(?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(first, second, leaf) DO UPDATE SET state = excluded.state, "
+        "started_at = excluded.started_at, finished_at = NULL, duration = NULL, "
+        "error = NULL, updated_at = excluded.updated_at",
+        (first, second, leaf, _level(second, leaf), RUNNING, now, now))
+
+
+def _finish(first, second, leaf, state, error=None):
+    now = time.time()
+    _connect().execute(
+        "INSERT INTO tasks(first, second, leaf, level, state, finished_at, error, updated_at) "
+        "VALUES(?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(first, second, leaf) DO UPDATE SET state = excluded.state, "
+        "finished_at = excluded.finished_at, duration = excluded.finished_at - started_at, "
+        "error = excluded.error, updated_at = excluded.updated_at",
+        (first, second, leaf, _level(second, leaf), state, now, error, now))
+
+
+def finish(first, second="", leaf=""):
+    _finish(first, second, leaf, DONE)
+
+
+def fail(first, second="", leaf="", error=""):
+    _finish(first, second, leaf, FAILED, str(error)[:500])
+
+
+def import_excel(path=OUTPUT_XLSX):
+    """
+    从 一级类目.xlsx 导入一级任务：第二列为 1 的类目待爬，第三列为 1 的视为已完成。
+    上次被中断时仍为 running 的二、三级任务重置为 pending。
+    """
+    ws = load_workbook(path, read_only=True).active
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE tasks SET state = ?, updated_at = ? WHERE state = ?",
+                     (PENDING, now, RUNNING))
+        # 本次 Excel 中未勾选的一级类目不再参与调度
+        conn.execute("UPDATE tasks SET excel_row = NULL WHERE level = 1")
+        for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            name, ready = row[0], row[1] if len(row) > 1 else None
+            finished = len(row) > 2 and row[2] == 1
+            if ready != 1 or not name:
+                continue
+            # 一级任务的完成状态以 Excel 为准，清掉第三列即可重新爬取
+            conn.execute(
+                "INSERT INTO tasks(first, level, state, excel_row, updated_at) VALUES(?, 1, ?, ?, ?) "
+                "ON CONFLICT(first, second, leaf) DO UPDATE SET excel_row = excluded.excel_row, "
+                "state = excluded.state, updated_at = excluded.updated_at",
+                (name, DONE if finished else PENDING, i, now))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def pending_first_levels():
+    """待爬的一级类目 [(名称, Excel 行号), ...]，按 Excel 顺序"""
+    return _connect().execute(
+        "SELECT first, excel_row FROM tasks WHERE level = 1 AND state != ? "
+        "AND excel_row IS NOT NULL ORDER BY excel_row", (DONE,)).fetchall()
+
+
+def export_excel(path=OUTPUT_XLSX):
+    """把已完成的一级类目写回 一级类目.xlsx 第三列（只在主进程结束时调用一次）"""
+    rows = _connect().execute(
+        "SELECT excel_row FROM tasks WHERE level = 1 AND state = ? AND excel_row IS NOT NULL",
+        (DONE,)).fetchall()
+    wb = load_workbook(path)
+    ws = wb.active
+    for (row_idx,) in rows:
+        ws.cell(row=row_idx, column=3, value=1)
+    wb.save(path)
+
+
+def summary():
+    """打印各级任务的状态数量和平均耗时"""
+    rows = _connect().execute(
+        "SELECT level, state, COUNT(*), AVG(duration) FROM tasks GROUP BY level, state "
+        "ORDER BY level, state").fetchall()
+    for level, state, n, avg in rows:
+        avg_s = f"，平均 {avg:.1f}s" if avg is not None else ""
+        print(f"[任务状态] {level}级 {state}：{n} 个{avg_s}")
+
+
+if __name__ == '__main__':
+    summary()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+telemetry.py：各模块、各进程的结构化计时与计数
+         （每个进程追加写自己的 JSONL 事件文件，互不加锁 + 运行结束汇总各阶段 p50/p95 + Prometheus textfile）
+用法：python telemetry.py [运行编号]  重新汇总某次运行（默认最近一次）
+"""
+
+import os
+import sys
+import json
+import glob
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# -------- 配置 --------
+TELEMETRY_DIR = "telemetry"
+PROM_FILE     = os.path.join(TELEMETRY_DIR, "crawler.prom")  # 供 node_exporter textfile 采集
+RUN_ENV       = "CRAWLER_RUN_ID"  # main.py 写入，子进程继承，同一次运行的事件归到一起
+# ----------------------
+
+_lock = threading.Lock()
+_file = None
+_file_pid = None
+
+
+def run_id() -> str:
+    """本次运行的编号；单独运行某个模块时按启动时间生成，子进程通过环境变量继承"""
+    rid = os.environ.get(RUN_ENV)
+    if not rid:
+        rid = time.strftime("%Y%m%d-%H%M%S")
+        os.environ[RUN_ENV] = rid
+    return rid
+
+
+def _out():
+    global _file, _file_pid
+    # fork 出来的子进程写自己的文件
+    if _file is None or _file_pid != os.getpid():
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        path = os.path.join(TELEMETRY_DIR, f"{run_id()}-{os.getpid()}.jsonl")
+        # 行缓冲：子进程被直接结束时已写的事件也不会丢
+        _file = open(path, "a", encoding="utf-8", buffering=1)
+        _file_pid = os.getpid()
+    return _file
+
+
+def event(stage: str, seconds: float = None, **fields):
+    """记录一条事件；seconds 为耗时，fields 可带 rows / bytes / count 等数值以及任意说明字段"""
+    rec = {"ts": round(time.time(), 3), "pid": os.getpid(),
+           "module": os.path.splitext(os.path.basename(sys.argv[0]))[0], "stage": stage}
+    if seconds is not None:
+        rec["seconds"] = round(seconds, 6)
+    rec.update(fields)
+    try:
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        with _lock:
+            _out().write(line)
+    except OSError:
+        pass  # 统计失败不影响爬取
+
+
+def count(stage: str, n: int = 1, **fields):
+    """计数类事件，例如重试次数"""
+    event(stage, count=n, **fields)
+
+
+@contextmanager
+def timer(stage: str, **fields):
+    """计时代码块；块内可以往 yield 出来的字典里补充 rows / bytes 等字段"""
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        event(stage, time.perf_counter() - start, **fields)
+
+
+# ———— 汇总 ————
+
+def load(rid: str):
+    """读出某次运行所有进程的事件"""
+    for path in sorted(glob.glob(os.path.join(TELEMETRY_DIR, f"{rid}-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # 进程中途被结束时可能留下半行
+
+
+def latest_run():
+    files = glob.glob(os.path.join(TELEMETRY_DIR, "*.jsonl"))
+    if not files:
+        return None
+    return os.path.basename(max(files, key=os.path.getmtime)).rsplit("-", 1)[0]
+
+
+def percentile(values, q: float) -> float:
+    """最近秩法分位数，values 已排序"""
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+def aggregate(events) -> dict:
+    """按阶段汇总：{stage: {"n", "seconds"（已排序）, "count", "rows", "bytes"}}"""
+    stats = {}
+    for e in events:
+        s = stats.setdefault(e["stage"], {"n": 0, "seconds": [], "count": 0, "rows": 0, "bytes": 0})
+        s["n"] += 1
+        if e.get("seconds") is not None:
+            s["seconds"].append(e["seconds"])
+        for k in ("count", "rows", "bytes"):
+            if isinstance(e.get(k), (int, float)):
+                s[k] += e[k]
+    for s in stats.values():
+        s["seconds"].sort()
+    return stats
+
+
+def _label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(stats: dict, rid: str, path: str = PROM_FILE):
+    """写成 Prometheus 文本格式：先写临时文件再改名，采集端不会读到一半"""
+    lines = [
+        "# HELP crawler_stage_seconds Per-stage latency of the last run.",
+        "# TYPE crawler_stage_seconds summary",
+    ]
+    for stage, s in sorted(stats.items()):
+        secs = s["seconds"]
+        if not secs:
+            continue
+        lbl = f'run="{_label(rid)}",stage="{_label(stage)}"'
+        for q in (0.5, 0.95):
+            lines.append(f'crawler_stage_seconds{{{lbl},quantile="{q}"}} {percentile(secs, q):.6f}')
+        lines.append(f"crawler_stage_seconds_sum{{{lbl}}} {sum(secs):.6f}")
+        lines.append(f"crawler_stage_seconds_count{{{lbl}}} {len(secs)}")
+    for metric in ("count", "rows", "bytes"):
+        lines.append(f"# TYPE crawler_stage_{metric}_total counter")
+        for stage, s in sorted(stats.items()):
+            if s[metric]:
+                lines.append(f'crawler_stage_{metric}_total{{run="{_label(rid)}",stage="{_label(stage)}"}} '
+                             f"{s[metric]}")
+    lines.append("# TYPE crawler_last_run_timestamp_seconds gauge")
+    lines.append(f"crawler_last_run_timestamp_seconds {time.time():.0f}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def summary(rid: str = None):
+    """打印某次运行各阶段的次数、p50/p95/最大耗时和吞吐，并写出 Prometheus textfile"""
+    rid = rid or run_id()
+    stats = aggregate(load(rid))
+    if not stats:
+        print(f"[统计] 运行 {rid} 没有记录到事件")
+        return stats
+    print(f"\n[统计] 运行 {rid} 各阶段耗时（秒）：")
+    print(f"{'阶段':<24}{'次数':>8}{'总计':>10}{'p50':>9}{'p95':>9}{'最大':>9}  其它")
+    for stage, s in sorted(stats.items(), key=lambda kv: -sum(kv[1]["seconds"])):
+        secs = s["seconds"]
+        total = sum(secs)
+        extra = []
+        if s["count"]:
+            extra.append(f"计数 {s['count']}")
+        if s["rows"]:
+            extra.append(f"{s['rows']} 行" + (f"，{s['rows'] / total:.1f} 行/秒" if total else ""))
+        if s["bytes"]:
+            extra.append(f"{s['bytes'] / 1024 / 1024:.1f}MB")
+        if secs:
+            print(f"{stage:<24}{s['n']:>8}{total:>10.1f}{percentile(secs, 0.5):>9.3f}"
+                  f"{percentile(secs, 0.95):>9.3f}{secs[-1]:>9.3f}  {'，'.join(extra)}")
+        else:
+            print(f"{stage:<24}{s['n']:>8}{'-':>10}{'-':>9}{'-':>9}{'-':>9}  {'，'.join(extra)}")
+    try:
+        write_prometheus(stats, rid)
+        print(f"[统计] 已写出 {PROM_FILE}")
+    except OSError as e:
+        print(f"[警告] 写出 Prometheus 文件失败：{e}")
+    return stats
+
+
+if __name__ == '__main__':
+    rid = sys.argv[1] if len(sys.argv) > 1 else latest_run()
+    if rid is None:
+        print("没有找到任何统计事件。")
+    else:
+        summary(rid)
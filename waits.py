@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+waits.py：页面就绪条件等待层，替代固定 time.sleep
+         （表格刷新 / 分页到第 p 页 / 指标卡片加载完成 / 级联菜单变化 + 每类等待耗时统计）
+"""
+
+import time
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+import telemetry
+
+# -------- 配置 --------
+POLL_INTERVAL   = 0.1   # 轮询间隔（秒）
+DEFAULT_TIMEOUT = 5     # 单次等待上限（秒）
+# ----------------------
+
+# 等待名称 -> [次数, 总耗时, 最长耗时, 超时次数]
+TIMINGS = {}
+
+TABLE_ROW_IMG = "tbody.next-channel-table-body tr.next-channel-table-row img.offer-img"
+PAGINATION    = "span.next-channel-pagination-display"
+MENU_WRAPPER  = ".next-channel-overlay-wrapper .next-channel-cascader-menu-wrapper"
+MENU_TEXT     = ".next-channel-menu-item-text"
+CARD_NUMBER   = ".card_content_item_box_number"
+
+
+def _record(name: str, elapsed: float, timed_out: bool):
+    t = TIMINGS.setdefault(name, [0, 0.0, 0.0, 0])
+    t[0] += 1
+    t[1] += elapsed
+    t[2] = max(t[2], elapsed)
+    t[3] += int(timed_out)
+
+
+def wait_for(driver, condition, name: str, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    最多等待 timeout 秒直到 condition(driver) 为真，并记录耗时。
+    超时不抛异常，返回 False，调用方照常往下走（与原先固定等待的容错一致）。
+    """
+    start = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+        ok = True
+    except TimeoutException:
+        ok = False
+    elapsed = time.perf_counter() - start
+    _record(name, elapsed, not ok)
+    telemetry.event(f"wait.{name}", elapsed, timeout=not ok)
+    return ok
+
+
+def pause(name: str, seconds: float):
+    """失败重试前的退避；没有可等待的页面状态，只做计时"""
+    start = time.perf_counter()
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - start
+    _record(name, elapsed, False)
+    telemetry.event(f"sleep.{name}", elapsed)
+
+
+# ———— 页面状态快照 ————
+
+def table_signature(driver):
+    """表格当前内容的指纹：分页文字 + 各行商品图片链接"""
+    return tuple(driver.execute_script(
+        "const p = document.querySelector(arguments[0]);"
+        "const imgs = document.querySelectorAll(arguments[1]);"
+        "return [p ? p.textContent.trim() : ''].concat("
+        "  Array.from(imgs, i => i.getAttribute('src') || ''));",
+        PAGINATION, TABLE_ROW_IMG
+    ) or ())
+
+
+def cascader_signature(driver):
+    """级联菜单当前状态的指纹：菜单列数 + 最后一列的文字"""
+    return tuple(driver.execute_script(
+        "const ws = document.querySelectorAll(arguments[0]);"
+        "return [ws.length, ws.length ? ws[ws.length - 1].textContent : ''];",
+        MENU_WRAPPER
+    ) or ())
+
+
+def card_values(driver):
+    """所有指标卡片当前显示的数值"""
+    return tuple(driver.execute_script(
+        "return Array.from(document.querySelectorAll(arguments[0]),"
+        "                  n => n.textContent.trim());",
+        CARD_NUMBER
+    ) or ())
+
+
+def mark_cards(driver):
+    """给当前的指标卡片数值节点打上标记；页面重新渲染卡片后新节点没有标记"""
+    driver.execute_script(
+        "document.querySelectorAll(arguments[0]).forEach(n => { n.__before_switch = true; });",
+        CARD_NUMBER)
+
+
+def cards_rerendered(driver) -> bool:
+    """卡片数值节点中有 mark_cards 之后新渲染的"""
+    return bool(driver.execute_script(
+        "return Array.from(document.querySelectorAll(arguments[0])).some(n => !n.__before_switch);",
+        CARD_NUMBER))
+
+
+# ———— 就绪条件 ————
+
+def table_changed(before):
+    """
+    表格各行的商品图片与点击前不同（翻页、切换类目、切换榜单后）。
+    不比较分页文字：分页可能先于表格行更新，那时读到的还是上一页的行
+    """
+    return lambda d: table_signature(d)[1:] != tuple(before)[1:]
+
+
+def pagination_shows(page: int):
+    """分页显示为第 page 页，例如 '3/12'"""
+    def _cond(d):
+        sig = table_signature(d)
+        return bool(sig) and sig[0].split("/")[0].strip() == str(page)
+    return _cond
+
+
+def cascader_expanded(columns: int, before):
+    """
+    级联菜单展开到 columns 列，且最后一列的内容与点击前不同；列数不到 columns - 1 时
+    说明点到的是叶子、弹出层已关闭，也算完成。
+    点击会先移除旧的下级列、新列稍后才渲染，只判断“有变化”会在这个中间状态提前返回
+    """
+    last_before = (before or (0, ""))[1]
+    def _cond(d):
+        count, last = cascader_signature(d) or (0, "")
+        return (count >= columns and last != last_before) or count < columns - 1
+    return _cond
+
+
+def menu_has(level: int, label: str):
+    """第 level 列（0 起）已渲染，且其中有文字为 label 的菜单项"""
+    return lambda d: bool(d.execute_script(
+        "const w = document.querySelectorAll(arguments[0])[arguments[1]];"
+        "return !!w && Array.from(w.querySelectorAll(arguments[2]),"
+        "                         t => t.innerText.trim()).includes(arguments[3]);",
+        MENU_WRAPPER, level, MENU_TEXT, label
+    ))
+
+
+def menu_wrappers_at_least(n: int):
+    """弹出层里的级联菜单列数至少为 n"""
+    return lambda d: cascader_signature(d)[0] >= n
+
+
+def metrics_loaded():
+    """指标卡片已渲染且都不再显示 '加载中'"""
+    def _cond(d):
+        vals = card_values(d)
+        return bool(vals) and not any("加载中" in v for v in vals)
+    return _cond
+
+
+def metrics_switched(before):
+    """
+    切换时间范围（点击前已 mark_cards）后卡片刷新完成：已加载完，且数值与点击前不同、
+    或等待期间出现过“加载中”、或卡片被重新渲染过。新旧窗口数值相同（零流量、低流量商品常见）时
+    靠后两种判断。条件对象记住是否出现过“加载中”，同一次切换要反复使用同一个对象
+    """
+    seen_loading = False
+    def _cond(d):
+        nonlocal seen_loading
+        vals = card_values(d)
+        if not vals or any("加载中" in v for v in vals):
+            seen_loading = True
+            return False
+        return vals != before or seen_loading or cards_rerendered(d)
+    return _cond
+
+
+def element_present(css: str):
+    return lambda d: bool(d.execute_script("return !!document.querySelector(arguments[0]);", css))
+
+
+def report(prefix: str = ""):
+    """打印本进程各类等待的次数与耗时"""
+    if not TIMINGS:
+        return
+    print(f"{prefix}[等待统计] 名称 次数 平均(s) 最长(s) 超时")
+    for name, (n, total, longest, timeouts) in sorted(TIMINGS.items()):
+        print(f"{prefix}  {name} {n} {total / n:.3f} {longest:.3f} {timeouts}")